@@ -1,29 +1,65 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
-import ast
-
+import os
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
+import time
+import hashlib
+import random
+import uuid
+import click
+from datetime import datetime, timedelta, timezone
+import functools
+import itertools
+import threading
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify, g, session, stream_with_context
 import logging
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
 from sqlalchemy.sql import func
+import search
+import typeahead
+import facets
+import cache
+import fragment_cache
+import database
+import bulk_import
+import export
+import viewmodels
+import metrics
+import profiler
+from werkzeug.utils import import_string
+from werkzeug.local import LocalProxy
+from werkzeug.datastructures import MultiDict
+from jinja2 import FileSystemBytecodeCache
+import startup
+
+# only needed by some routes or commands; these run on first use
+babel_dates = startup.lazy_import('babel.dates')
+dateutil_parser = startup.lazy_import('dateutil.parser')
+flask_migrate = startup.lazy_import('flask_migrate')
+flask_moment = startup.lazy_import('flask_moment')
+forms = startup.lazy_import('forms')
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app = Flask(__name__)
-moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+if app.config['LAZY_IMPORTS']:
+  # the `moment` template helper imports flask_moment when first used
+  app.context_processor(lambda: {'moment': LocalProxy(lambda: flask_moment._moment)})
+else:
+  startup.load(babel_dates, dateutil_parser, flask_migrate, flask_moment, forms)
+  moment = flask_moment.Moment(app)
+# explicit SQLALCHEMY_ENGINE_OPTIONS win over the DATABASE_* settings
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(database.engine_options(app.config),
+                                              **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {},
+                                      **database.replica_binds(app.config))
+db = database.SQLAlchemy(app)
+# migrations are only run through the flask command
+if not app.config['LAZY_IMPORTS'] or os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+  migrate = flask_migrate.Migrate(app, db)
 
 # TODO: connect to a local postgresql database
 
@@ -33,6 +69,9 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -45,8 +84,11 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(110))
     image_link = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
-    genres = db.relationship('Genre', backref=db.backref("venue"))
+    genres = db.relationship('Genre', secondary='venue_genre', backref=db.backref("venues"))
 
     atists = db.relationship(
         'Artist',
@@ -70,8 +112,11 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean(), default=False)
     seeking_description = db.Column(db.String(120))
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
-    genres = db.relationship('Genre', backref=db.backref("artist"))
+    genres = db.relationship('Genre', secondary='artist_genre', backref=db.backref("artists"))
 
     venues = db.relationship(
         'Venue',
@@ -81,38 +126,751 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id))
     venue_id = db.Column(db.Integer,  db.ForeignKey(Venue.id))
     start_time = db.Column(db.DateTime, default = db.func.now())
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     artist = db.relationship(Artist, backref=db.backref("artist_assoc"))
     venue = db.relationship(Venue, backref=db.backref("venue_assoc"))
 
 class Genre(db.Model):
     __tablename__ = 'genre'
+    __table_args__ = (
+        db.Index('ix_genre_name', 'name', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name =  db.Column(db.String(120))
-    artist_id = db.Column(db.Integer, db.ForeignKey(Artist.id))
-    venue_id = db.Column(db.Integer,  db.ForeignKey(Venue.id))
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+    name =  db.Column(db.String(120), nullable=False)
+
+# Genres are a shared dictionary; artists and venues point at them through
+# association tables. The primary keys serve lookups by entity, the extra
+# index serves filtering by genre.
+artist_genre = db.Table('artist_genre',
+    db.Column('artist_id', db.Integer, db.ForeignKey(Artist.id), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(Genre.id), primary_key=True),
+    db.Index('ix_artist_genre_genre_id', 'genre_id'),
+)
+
+venue_genre = db.Table('venue_genre',
+    db.Column('venue_id', db.Integer, db.ForeignKey(Venue.id), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey(Genre.id), primary_key=True),
+    db.Index('ix_venue_genre_genre_id', 'genre_id'),
+)
+
+def genres_by_name(names):
+  # returns the Genre rows for `names`, inserting the missing ones in bulk
+  names = sorted(set(name for name in names if name))
+  if not names:
+    return []
+
+  genres = Genre.query.filter(Genre.name.in_(names)).all()
+  missing = set(names) - set(genre.name for genre in genres)
+  if missing:
+    db.session.execute(Genre.__table__.insert(), [{'name': name} for name in sorted(missing)])
+    genres = Genre.query.filter(Genre.name.in_(names)).all()
+  return genres
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 
+search.install(Venue.__table__)
+search.install(Artist.__table__)
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry materialised upcoming/past show counters so pages
+# never count show rows. A new show bumps its counters in the same
+# transaction; the refresh-show-counters command, run periodically, moves
+# shows that have started from upcoming to past.
+
+def count_show(show):
+  counter = 'upcoming_shows_count' if show.start_time > datetime.now() else 'past_shows_count'
+  for model, entity_id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+    column = getattr(model, counter)
+    model.query.filter_by(id=entity_id).update({column: column + 1}, synchronize_session=False)
+
+SHOW_FOREIGN_KEYS = {Venue: Show.venue_id, Artist: Show.artist_id}
+
+def recount_shows(model, ids=None, now=None):
+  # recomputes the counters of every `model` row, or of those whose id is
+  # in `ids` (a list or a query); the caller commits
+  now = now or datetime.now()
+  shows = db.session.query(func.count(Show.id)) \
+    .filter(SHOW_FOREIGN_KEYS[model] == model.id) \
+    .correlate(model)
+  upcoming = shows.filter(Show.start_time > now).as_scalar()
+  past = shows.filter(Show.start_time <= now).as_scalar()
+  # only rows whose counters change are written, so updated_at moves only
+  # when the pages do
+  update = model.__table__.update() \
+    .values(upcoming_shows_count=upcoming, past_shows_count=past) \
+    .where(db.or_(model.upcoming_shows_count != upcoming, model.past_shows_count != past))
+  if ids is not None:
+    update = update.where(model.id.in_(ids))
+  db.session.execute(update)
+
+def refresh_show_counters(since=None):
+  # recomputes the counters of every venue and artist, or only of those with
+  # a show that started between `since` and now
+  now = datetime.now()
+  for model, foreign_key in SHOW_FOREIGN_KEYS.items():
+    ids = None
+    if since is not None:
+      ids = db.session.query(foreign_key).filter(Show.start_time > since, Show.start_time <= now)
+    recount_shows(model, ids, now)
+  db.session.commit()
+
+@app.cli.command('refresh-show-counters')
+@click.option('--window', type=int, default=None,
+              help='Only refresh entities with shows that started in the last WINDOW minutes.')
+def refresh_show_counters_command(window):
+  since = datetime.now() - timedelta(minutes=window) if window is not None else None
+  refresh_show_counters(since)
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# `flask import` loads venues, artists, genres or shows from CSV or JSON
+# lines. Rows are validated with the forms in forms.py and loaded a batch per
+# transaction; see bulk_import.py.
+
+IMPORT_FORMS = {'venues': 'VenueForm', 'artists': 'ArtistForm', 'shows': 'ShowForm'}
+
+def import_formdata(row):
+  # the row as posted form data; genres may be a list or a comma-separated
+  # string and booleans map to checkbox values
+  formdata = MultiDict()
+  for key, value in row.items():
+    if key == 'genres' and isinstance(value, str):
+      value = [genre.strip() for genre in value.split(',') if genre.strip()]
+    if isinstance(value, bool):
+      value = 'y' if value else ''
+    for item in value if isinstance(value, list) else [value]:
+      if item is not None:
+        formdata.add(key, str(item))
+  return formdata
+
+def validate_import_row(form, row):
+  # returns (form data, None) or (None, errors); one form is reused for a
+  # whole batch, since binding its fields costs more than validating
+  form.process(import_formdata(row))
+  if not form.validate():
+    return None, form.errors
+  return form.data, None
+
+def import_entities(model, association, foreign_key, batch, now):
+  connection = db.session.connection()
+  ids = bulk_import.allocate_ids(connection, model.__table__, len(batch))
+  genre_ids = {genre.name: genre.id for genre in genres_by_name(name for data in batch for name in data['genres'])}
+  rows = []
+  links = []
+  for entity_id, data in zip(ids, batch):
+    genres = set(data.pop('genres'))
+    rows.append(dict(data, id=entity_id, updated_at=now))
+    links.extend({foreign_key: entity_id, 'genre_id': genre_ids[name]} for name in sorted(genres))
+  bulk_import.insert_rows(connection, model.__table__, rows)
+  bulk_import.insert_rows(connection, association, links)
+
+def resolve_show_references(rows, errors):
+  # fills artist_id / venue_id from artist_name / venue_name; rows whose
+  # names are unknown or ambiguous get an entry in `errors`
+  for model, key in ((Artist, 'artist'), (Venue, 'venue')):
+    names = set(row[key + '_name'] for row in rows if not row.get(key + '_id') and row.get(key + '_name'))
+    ids = {}
+    for entity_id, name in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+      ids.setdefault(name, []).append(entity_id)
+    for i, row in enumerate(rows):
+      if row.get(key + '_id') or not row.get(key + '_name'):
+        continue
+      matches = ids.get(row[key + '_name'], [])
+      if len(matches) == 1:
+        row[key + '_id'] = matches[0]
+      else:
+        errors.setdefault(i, {})[key + '_name'] = ['unknown {}'.format(key) if not matches else 'ambiguous {}'.format(key)]
+
+def existing_ids(model, values):
+  # the given ids (as strings) that exist for `model`
+  ids = set(int(value) for value in values if value.isdigit())
+  return set(str(entity_id) for entity_id, in db.session.query(model.id).filter(model.id.in_(ids)))
+
+def import_shows(batch, now):
+  connection = db.session.connection()
+  artist_ids = set(data['artist_id'] for data in batch)
+  venue_ids = set(data['venue_id'] for data in batch)
+  ids = bulk_import.allocate_ids(connection, Show.__table__, len(batch))
+  rows = [dict(data, id=show_id, updated_at=now) for show_id, data in zip(ids, batch)]
+  bulk_import.insert_rows(connection, Show.__table__, rows)
+  recount_shows(Venue, sorted(venue_ids))
+  recount_shows(Artist, sorted(artist_ids))
+
+def import_batch(kind, rows, now):
+  # validates and loads one batch; returns {row index: errors} for the
+  # rejected rows. The caller commits.
+  errors = {}
+  if kind == 'shows':
+    resolve_show_references(rows, errors)
+
+  valid = []
+  form = getattr(forms, IMPORT_FORMS[kind])(meta={'csrf': False}) if kind in IMPORT_FORMS else None
+  for i, row in enumerate(rows):
+    if i in errors:
+      continue
+    if kind == 'genres':
+      data, row_errors = row, None
+      if not (row.get('name') or '').strip():
+        row_errors = {'name': ['This field is required.']}
+    else:
+      data, row_errors = validate_import_row(form, row)
+    # a ShowForm without start_time would take its default
+    if kind == 'shows' and not row_errors and not row.get('start_time'):
+      row_errors = {'start_time': ['This field is required.']}
+    if row_errors:
+      errors[i] = row_errors
+    else:
+      valid.append((i, data))
+
+  if kind == 'shows':
+    # references must exist, or the whole batch would fail
+    known = {key: existing_ids(model, [data[key] for i, data in valid])
+             for key, model in (('artist_id', Artist), ('venue_id', Venue))}
+    checked = []
+    for i, data in valid:
+      missing = {key: ['unknown id'] for key in known if data[key] not in known[key]}
+      if missing:
+        errors[i] = missing
+      else:
+        checked.append((i, dict(data, artist_id=int(data['artist_id']), venue_id=int(data['venue_id']))))
+    valid = checked
+
+  batch = [data for i, data in valid]
+  if kind == 'venues':
+    import_entities(Venue, venue_genre, 'venue_id', batch, now)
+  elif kind == 'artists':
+    import_entities(Artist, artist_genre, 'artist_id', batch, now)
+  elif kind == 'genres':
+    genres_by_name(data['name'].strip() for data in batch)
+  else:
+    import_shows(batch, now)
+  return errors
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'genres', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', type=int, default=1000, help='Rows per transaction.')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), default=None,
+              help='Checkpoint file; defaults to PATH.checkpoint.')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start over.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), default=None,
+              help='Write rejected rows and their errors to this file as JSON lines.')
+def import_command(kind, path, format, batch_size, checkpoint_path, restart, errors_path):
+  checkpoint = bulk_import.Checkpoint(checkpoint_path or path + '.checkpoint', path, kind)
+  if restart:
+    checkpoint.clear()
+  skip = checkpoint.load()
+  if skip:
+    click.echo('Resuming after row {} ({})'.format(skip, checkpoint.path))
+
+  loaded = rejected = 0
+  started = time.perf_counter()
+  errors_file = open(errors_path, 'a' if skip else 'w') if errors_path else None
+  try:
+    with open(path, newline='', encoding='utf-8') as stream:
+      rows = bulk_import.read_rows(stream, format or bulk_import.detect_format(path))
+      for done, batch in bulk_import.batches(rows, batch_size, skip):
+        try:
+          errors = import_batch(kind, [dict(row) for row in batch], datetime.utcnow())
+          db.session.commit()
+        except Exception:
+          db.session.rollback()
+          click.echo('Batch after row {} failed; rerun to resume from there'.format(done), err=True)
+          raise
+        checkpoint.save(done + len(batch))
+
+        loaded += len(batch) - len(errors)
+        rejected += len(errors)
+        for i in sorted(errors):
+          if errors_file:
+            errors_file.write(json.dumps({'row': done + i + 1, 'errors': errors[i], 'data': batch[i]}) + '\n')
+        elapsed = time.perf_counter() - started
+        click.echo('{}: {} rows, {} loaded, {} rejected, {:.0f} rows/s'.format(
+          kind, done + len(batch), loaded, rejected, (loaded + rejected) / elapsed))
+  finally:
+    if errors_file:
+      errors_file.close()
+
+  checkpoint.clear()
+  elapsed = time.perf_counter() - started
+  click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/s), {} rejected'.format(
+    loaded, kind, elapsed, (loaded + rejected) / elapsed if elapsed else 0, rejected))
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+# Full dumps of the catalog for /export/... and `flask export`. Rows are
+# column tuples fetched through a server-side cursor (yield_per), never ORM
+# objects, and serialised as they arrive by export.py.
+
+EXPORT_COLUMNS = {
+  'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+             'website_link', 'seeking_talent', 'seeking_description'),
+  'artists': ('id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+              'website_link', 'seeking_talent', 'seeking_description'),
+}
+
+EXPORT_BATCH_SIZE = 1000
+
+def export_rows(kind, since=None, until=None, city=None, state=None):
+  # returns (column names, row iterator). Shows are filtered by start time
+  # and venue city/state, venues and artists by updated_at and city/state.
+  if kind == 'shows':
+    columns = ('id', 'start_time', 'artist_id', 'artist_name', 'venue_id', 'venue_name', 'venue_city', 'venue_state')
+    query = db.session.query(Show.id, Show.start_time, Show.artist_id, Artist.name, Show.venue_id,
+                             Venue.name, Venue.city, Venue.state) \
+      .join(Artist, Artist.id == Show.artist_id) \
+      .join(Venue, Venue.id == Show.venue_id) \
+      .order_by(Show.start_time, Show.id)
+    timestamp, place = Show.start_time, Venue
+  else:
+    model, association, foreign_key = {
+      'venues': (Venue, venue_genre, venue_genre.c.venue_id),
+      'artists': (Artist, artist_genre, artist_genre.c.artist_id),
+    }[kind]
+    columns = EXPORT_COLUMNS[kind] + ('genres',)
+    # one row per genre, folded back into a list below; ordering by id keeps
+    # an entity's rows together
+    query = db.session.query(*[getattr(model, column) for column in EXPORT_COLUMNS[kind]] + [Genre.name]) \
+      .outerjoin(association, foreign_key == model.id) \
+      .outerjoin(Genre, Genre.id == association.c.genre_id) \
+      .order_by(model.id, Genre.name)
+    timestamp, place = model.updated_at, model
+
+  if since is not None:
+    query = query.filter(timestamp >= since)
+  if until is not None:
+    query = query.filter(timestamp < until)
+  if city:
+    query = query.filter(place.city == city)
+  if state:
+    query = query.filter(place.state == state)
+
+  rows = query.yield_per(EXPORT_BATCH_SIZE)
+  if kind != 'shows':
+    rows = (tuple(group[0][:-1]) + ([row[-1] for row in group if row[-1] is not None],)
+            for group in (list(group) for entity_id, group in itertools.groupby(rows, key=lambda row: row[0])))
+  return columns, rows
+
+def export_filters(values):
+  # since/until as dates or datetimes (ISO 8601), city and state as given
+  filters = {}
+  for key in ('since', 'until'):
+    if values.get(key):
+      filters[key] = datetime.fromisoformat(values[key])
+  for key in ('city', 'state'):
+    if values.get(key):
+      filters[key] = values[key]
+  return filters
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.option('--format', 'format', type=click.Choice(sorted(export.FORMATS)), default='csv')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              help='File to write; standard output by default.')
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the output with gzip.')
+@click.option('--since', default=None, help='Only rows from this date or time on.')
+@click.option('--until', default=None, help='Only rows before this date or time.')
+@click.option('--city', default=None)
+@click.option('--state', default=None)
+def export_command(kind, format, output, compress, **values):
+  columns, rows = export_rows(kind, **export_filters(values))
+  with click.open_file(output, 'wb') as f:
+    for chunk in export.stream(columns, rows, format, compress):
+      f.write(chunk if compress else chunk.encode('utf-8'))
+
+#----------------------------------------------------------------------------#
+# View cache.
+#----------------------------------------------------------------------------#
+
+# Venue and artist page view-models (see viewmodels.py) are cached as built:
+# they are immutable, so one instance is safely shared by every request that
+# hits the cache, and they pickle for an out-of-process backend. Keys carry
+# the page's validators (the updated_at of the entity and of the
+# counterparts it has shows with), so a write made through any worker moves
+# the key and every worker misses; the cache never needs invalidating and
+# never pairs an old view-model with a new ETag.
+
+def create_view_cache():
+  if app.config['VIEW_CACHE_BACKEND']:
+    backend = import_string(app.config['VIEW_CACHE_BACKEND'])()
+  else:
+    backend = cache.LRUCache(app.config['VIEW_CACHE_MAX_ENTRIES'])
+  return cache.ReadThroughCache(backend, ttl=app.config['VIEW_CACHE_TTL'],
+                                stale_ttl=app.config['VIEW_CACHE_STALE_TTL'], context=app.app_context)
+
+view_cache = create_view_cache()
+
+def page_key(kind, entity_id, validators):
+  return '{}:{}:{}'.format(kind, entity_id, ':'.join(
+    value.isoformat() if value is not None else '' for value in validators))
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Pages derive an ETag and Last-Modified from the updated_at columns of the
+# rows they show. A request whose If-None-Match or If-Modified-Since still
+# matches gets a 304 before any template is rendered.
+
+def not_modified(last_modified, *parts):
+  # records the validators for this response and returns a 304 response if
+  # the client's copy is current, otherwise None
+  etag = hashlib.sha1(repr((request.full_path, last_modified) + parts).encode()).hexdigest()
+  g.validators = (etag, last_modified)
+
+  # a pending flash message must be rendered
+  if '_flashes' in session:
+    return None
+
+  if request.if_none_match:
+    current = request.if_none_match.contains(etag)
+  elif request.if_modified_since and last_modified:
+    since = request.if_modified_since
+    if since.tzinfo is not None:
+      since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    current = last_modified.replace(microsecond=0) <= since
+  else:
+    current = False
+
+  if current:
+    return Response(status=304)
+  return None
+
+@app.after_request
+def add_validators(response):
+  validators = g.get('validators')
+  if validators and response.status_code in (200, 304):
+    etag, last_modified = validators
+    response.set_etag(etag)
+    if last_modified:
+      response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # let browsers keep the page but revalidate it on every visit
+    response.cache_control.no_cache = True
+  return response
+
+def last_modified_of(*values):
+  values = [value for value in values if value is not None]
+  return max(values) if values else None
+
+def venue_page_validators(venue_id):
+  # the venue row and the artists it has shows with; None if there is no venue
+  artists_updated_at = db.session.query(func.max(Artist.updated_at)) \
+    .join(Show, Show.artist_id == Artist.id) \
+    .filter(Show.venue_id == Venue.id) \
+    .correlate(Venue) \
+    .as_scalar()
+  return db.session.query(Venue.updated_at, artists_updated_at).filter(Venue.id == venue_id).first()
+
+def artist_page_validators(artist_id):
+  # the artist row and the venues it has shows at; None if there is no artist
+  venues_updated_at = db.session.query(func.max(Venue.updated_at)) \
+    .join(Show, Show.venue_id == Venue.id) \
+    .filter(Show.artist_id == Artist.id) \
+    .correlate(Artist) \
+    .as_scalar()
+  return db.session.query(Artist.updated_at, venues_updated_at).filter(Artist.id == artist_id).first()
+
+# In-memory name indexes behind /search/typeahead.
+venue_names = typeahead.PrefixIndex(app.config['TYPEAHEAD_CACHE_SIZE'])
+artist_names = typeahead.PrefixIndex(app.config['TYPEAHEAD_CACHE_SIZE'])
+
+# In-memory facet bitmaps behind /venues/browse and /artists/browse.
+FACETS = ('genre', 'state', 'seeking_talent')
+venue_facets = facets.FacetIndex(FACETS)
+artist_facets = facets.FacetIndex(FACETS)
+
+def facet_values(entity):
+  return {
+    'genre': [genre.name for genre in entity.genres],
+    'state': [entity.state],
+    'seeking_talent': ['true' if entity.seeking_talent else 'false'],
+  }
+
+def load_facet_values(model, association):
+  # (id, facet values) for every row of `model`, in two queries
+  entities = {}
+  for entity_id, state, seeking_talent in db.session.query(model.id, model.state, model.seeking_talent):
+    entities[entity_id] = {
+      'genre': [],
+      'state': [state],
+      'seeking_talent': ['true' if seeking_talent else 'false'],
+    }
+  entity_column = association.c[model.__tablename__ + '_id']
+  genres = db.session.query(entity_column, Genre.name).join(Genre, association.c.genre_id == Genre.id)
+  for entity_id, name in genres:
+    entities[entity_id]['genre'].append(name)
+  return entities.items()
+
+# Every worker process holds its own copy of these indexes. The create,
+# edit and delete handlers patch the copy of the worker that served them;
+# the other workers (and any after `flask import`) notice the change by the
+# row count and latest updated_at of venues and artists, which the views
+# that read the indexes check at most every INDEX_REFRESH_INTERVAL seconds,
+# and rebuild from the database. The first check builds them.
+INDEXES = (
+  (Venue, venue_genre, venue_names, venue_facets),
+  (Artist, artist_genre, artist_names, artist_facets),
+)
+indexes_lock = threading.Lock()
+indexes_built_from = {}
+indexes_checked_at = [None]
+
+def refresh_indexes():
+  checked_at = indexes_checked_at[0]
+  if checked_at is not None and time.monotonic() - checked_at < app.config['INDEX_REFRESH_INTERVAL']:
+    return
+  with indexes_lock:
+    if indexes_checked_at[0] != checked_at:
+      # another thread checked while this one waited
+      return
+    for model, association, names, facet_index in INDEXES:
+      # read before rebuilding, so a write in between triggers another rebuild
+      version = tuple(db.session.query(func.count(model.id), func.max(model.updated_at)).one())
+      if indexes_built_from.get(model) != version:
+        names.rebuild(db.session.query(model.id, model.name))
+        facet_index.rebuild(load_facet_values(model, association))
+        indexes_built_from[model] = version
+    indexes_checked_at[0] = time.monotonic()
+
+
+#----------------------------------------------------------------------------#
+# Query statistics.
+#----------------------------------------------------------------------------#
+
+# Every statement run while serving a request is counted and timed (see
+# database.QueryStats). Streamed bodies run their queries after the headers
+# are sent, so those are not included.
+
+@app.before_request
+def start_query_stats():
+  if app.config['SQL_INSTRUMENTATION']:
+    g.query_stats = database.QueryStats()
+
+@app.after_request
+def report_query_stats(response):
+  stats = g.get('query_stats')
+  if stats is None:
+    return response
+  response.headers.add('Server-Timing', 'db;dur={:.1f};desc="{} queries"'.format(stats.seconds * 1000, stats.count))
+  app.logger.info('%s %s: %d queries in %.1f ms', request.method, request.path, stats.count, stats.seconds * 1000)
+  for statement, count in stats.repeated(app.config['SQL_REPEATED_STATEMENT_THRESHOLD']):
+    app.logger.warning('View %s ran the same statement %d times (N+1?): %s',
+                       request.endpoint, count, ' '.join(statement.split()))
+  return response
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+# Request, template, SQL and pool metrics for /metrics; see metrics.py.
+app_metrics = metrics.Metrics() if app.config['METRICS_ENABLED'] and metrics.available else None
+if app_metrics is not None:
+  app.jinja_env.template_class = app_metrics.timed_template_class()
+  db.pool_listeners.append(app_metrics.observe_pool)
+
+  @app.before_request
+  def start_request_timer():
+    g.request_started = time.perf_counter()
+
+  @app.after_request
+  def observe_request(response):
+    started = g.get('request_started')
+    if started is not None:
+      app_metrics.observe_request(request.endpoint, request.method, response.status_code,
+                                  time.perf_counter() - started, g.get('query_stats'))
+    return response
+
+#----------------------------------------------------------------------------#
+# Profiling.
+#----------------------------------------------------------------------------#
+
+# Individual requests are profiled on demand (a signed X-Profile header) or
+# sampled at PROFILER_SAMPLE_RATE; see profiler.py. Each profile is named
+# after the time, view and request id (X-Request-ID, or a new one), which
+# the response echoes in X-Profile-Id. Streamed bodies are not covered.
+
+def profile_mode():
+  # the profiler mode for this request, or None
+  header = request.headers.get('X-Profile')
+  if header:
+    secret = app.config['PROFILER_SECRET']
+    return profiler.verify(secret, header) if secret else None
+  rate = app.config['PROFILER_SAMPLE_RATE']
+  endpoints = app.config['PROFILER_ENDPOINTS']
+  if rate and (not endpoints or request.endpoint in endpoints) and random.random() < rate:
+    return app.config['PROFILER_MODE']
+  return None
+
+@app.before_request
+def start_profiler():
+  mode = profile_mode()
+  if mode is None:
+    return
+  request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+  g.profile = (profiler.output_name(request.endpoint, request_id),
+               profiler.create(mode, app.config['PROFILER_INTERVAL']))
+  g.profile[1].start()
+
+@app.after_request
+def add_profile_id(response):
+  if g.get('profile'):
+    response.headers['X-Profile-Id'] = g.profile[0]
+  return response
+
+@app.teardown_request
+def write_profile(error=None):
+  if not g.get('profile'):
+    return
+  name, profile = g.pop('profile')
+  profile.stop()
+  # a full or read-only disk loses the profile, not the request
+  try:
+    os.makedirs(app.config['PROFILER_DIR'], exist_ok=True)
+    path = profile.write(os.path.join(app.config['PROFILER_DIR'], name))
+  except OSError:
+    app.logger.warning('Could not write the profile of %s %s', request.method, request.path, exc_info=True)
+    return
+  app.logger.info('Profiled %s %s to %s', request.method, request.path, path)
+
+@app.cli.command('profile-header')
+@click.option('--mode', type=click.Choice(profiler.MODES), default='sampling')
+@click.option('--ttl', type=int, default=600, help='Seconds the header stays valid.')
+def profile_header_command(mode, ttl):
+  # the header works on every worker sharing PROFILER_SECRET
+  if not app.config['PROFILER_SECRET']:
+    raise click.ClickException('PROFILER_SECRET is not set')
+  click.echo('X-Profile: ' + profiler.sign(app.config['PROFILER_SECRET'], mode, time.time() + ttl))
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format):
+  # compiled babel pattern for a format name or a raw CLDR pattern
+  return babel_dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+@functools.lru_cache(maxsize=None)
+def datetime_locale():
+  return babel_dates.Locale.parse(babel_dates.LC_TIME)
+
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format)
+  # accepts datetimes, or strings which are parsed first
+  if not isinstance(value, datetime):
+    value = dateutil_parser.parse(value)
+  return datetime_pattern(format).apply(value, datetime_locale())
+
+# show pages repeat the same timestamps a lot; DATETIME_FILTER_MEMO_SIZE > 0
+# memoises that many formatted (value, format) pairs
+if app.config['DATETIME_FILTER_MEMO_SIZE']:
+  app.jinja_env.filters['datetime'] = functools.lru_cache(app.config['DATETIME_FILTER_MEMO_SIZE'])(format_datetime)
+else:
+  app.jinja_env.filters['datetime'] = format_datetime
+
+# {% cache %} blocks; show tiles are keyed by the show id and the latest
+# updated_at of the show and the entities shown on the tile
+app.jinja_env.add_extension(fragment_cache.FragmentCacheExtension)
+if app.config['FRAGMENT_CACHE_BACKEND']:
+  app.jinja_env.fragment_cache = import_string(app.config['FRAGMENT_CACHE_BACKEND'])()
+elif app.config['FRAGMENT_CACHE_MAX_ENTRIES']:
+  app.jinja_env.fragment_cache = cache.LRUCache(app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+app.jinja_env.fragment_cache_ttl = app.config['FRAGMENT_CACHE_TTL']
+
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
 
-app.jinja_env.filters['datetime'] = format_datetime
+if app.config['TEMPLATE_BYTECODE_CACHE_DIR']:
+  os.makedirs(app.config['TEMPLATE_BYTECODE_CACHE_DIR'], exist_ok=True)
+  app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_CACHE_DIR'])
+
+# forms the form templates are rendered with during warm-up; other variables
+# are left empty
+WARMUP_FORMS = {
+  'forms/new_venue.html': 'VenueForm',
+  'forms/edit_venue.html': 'VenueForm',
+  'forms/new_artist.html': 'ArtistForm',
+  'forms/edit_artist.html': 'ArtistForm',
+  'forms/new_show.html': 'ShowForm',
+}
+
+def compile_templates():
+  # loads every template, which compiles it and writes its bytecode
+  names = app.jinja_env.list_templates(extensions=['html'])
+  for name in names:
+    app.jinja_env.get_template(name)
+  return names
+
+def warm_up_templates():
+  # renders each page once with placeholder data so the first real request
+  # finds templates, filters and url building ready
+  names = compile_templates()
+  with app.test_request_context():
+    for name in names:
+      if name.startswith('layouts/'):
+        continue
+      context = {'venue': {}, 'artist': {}, 'results': {}, 'genres': ()}
+      if name in WARMUP_FORMS:
+        context['form'] = getattr(forms, WARMUP_FORMS[name])()
+      try:
+        render_template(name, **context)
+      except Exception:
+        app.logger.warning('Could not warm up template %s', name, exc_info=True)
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+  started = time.perf_counter()
+  names = compile_templates()
+  click.echo('Compiled {} templates into {} in {:.2f}s'.format(
+    len(names), app.config['TEMPLATE_BYTECODE_CACHE_DIR'] or 'memory', time.perf_counter() - started))
+
+#----------------------------------------------------------------------------#
+# Startup profiling.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('startup-profile')
+@click.option('--path', default='/', help='Path of the first request.')
+@click.option('--eager', is_flag=True, help='Profile with LAZY_IMPORTS=0.')
+@click.option('--as-json', is_flag=True, help='Print the report as JSON.')
+def startup_profile_command(path, eager, as_json):
+  # imports the app in a fresh interpreter and serves one request
+  env = {'LAZY_IMPORTS': '0'} if eager else {}
+  report = startup.profile_startup(__name__, path=path, env=env)
+  if as_json:
+    click.echo(json.dumps(report, indent=2))
+    return
+
+  click.echo('{:<28} {:>10} {:>10}'.format('import', 'self ms', 'total ms'))
+  imports = sorted(report['imports'][1:], key=lambda entry: -entry['cumulative_ms'])
+  for entry in report['imports'][:1] + imports:
+    click.echo('{module:<28} {self_ms:>10.1f} {cumulative_ms:>10.1f}'.format(**entry))
+  click.echo('')
+  click.echo('import:        {:8.1f} ms ({} modules after first request)'.format(report['import_ms'], report['modules_loaded']))
+  click.echo('first request: {:8.1f} ms (GET {} -> {})'.format(report['first_request_ms'], path, report['status']))
+  click.echo('total:         {:8.1f} ms'.format(report['import_ms'] + report['first_request_ms']))
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -128,109 +886,147 @@ def index():
 
 @app.route('/venues')
 def venues():
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
-
-  # grouped_venues =  db.session.query(Venue.name, func.count(Venue.city)).group_by(Venue.city).all()
+  last_modified, count = db.session.query(func.max(Venue.updated_at), func.count(Venue.id)).one()
+  response = not_modified(last_modified, count)
+  if response:
+    return response
+
+  # A single statement returns every venue with its area and its materialised
+  # upcoming show counter, ordered by area so the groups can be built in one
+  # pass over the rows.
+  rows = db.session.query(Venue.city, Venue.state, Venue.id, Venue.name, Venue.upcoming_shows_count) \
+    .order_by(Venue.city, Venue.state, Venue.id) \
+    .all()
 
   data = []
-  venue_groups = db.session.query(Venue.city, Venue.state, func.count(Venue.city), 
-  func.count(Venue.state)).group_by(Venue.city, Venue.state).all()
-
-  for i in range(len(venue_groups)):
-    data_dict = {}
-    
-    filterd_venues = Venue.query.filter_by(city=venue_groups[i][0], state=venue_groups[i][1]).all()
-
-    data_dict['city'] = filterd_venues[0].city
-    data_dict['state'] = filterd_venues[0].state
-
-    venue_list = []
-    for venue in filterd_venues:
-        venue_dict = {}
-        venue_dict['id'] = venue.id
-        venue_dict['name'] = venue.name  
-
-        venue_dict['num_upcoming_shows'] = Show.query.filter_by(venue_id = venue.id ).filter(Show.start_time > datetime.now()).count()
-
-        venue_list.append(venue_dict)
-    data_dict['venues']= venue_list
+  for city, state, venue_id, name, num_upcoming_shows in rows:
+    if not data or data[-1]['city'] != city or data[-1]['state'] != state:
+      data.append({'city': city, 'state': state, 'venues': []})
 
-    data.append(data_dict)
+    data[-1]['venues'].append({
+      'id': venue_id,
+      'name': name,
+      'num_upcoming_shows': num_upcoming_shows,
+    })
 
-  return render_template('pages/venues.html', areas=data);
+  return render_template('pages/venues.html', areas=data)
 
 @app.route('/venues/search', methods=['POST'])
+@database.replica_reads
 def search_venues():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
  
   search_term = request.form.get('search_term')
-  search = "%{}%".format(search_term)
-  venues = Venue.query.filter(func.lower(Venue.name).like(func.lower(search))).all()
+  venues = search.search_names(db.session, Venue, search_term, app.config['SEARCH_RESULT_LIMIT'])
 
-  response = {}
-  data = []
-  for venue in venues:
-    dict = {}
-    dict['id'] = venue.id
-    dict['name'] = venue.name
-    data.append(dict)
-  response['count'] = len(data)
-  response['data'] = data
+  data = [{'id': venue_id, 'name': name} for venue_id, name in venues]
+  response = {'count': len(data), 'data': data}
 
   return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term'))
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-
-  venue = Venue.query.get(venue_id)
-  data = venue.__dict__
-  genre_list = []
-
-  for genre in venue.genres:
-    genre_list.append(genre.name)
-  data['genres'] = genre_list
-
-  comming_shows = []
+@app.route('/search/typeahead')
+def search_typeahead():
+  # name suggestions for ?q= among ?type=venues (default) or ?type=artists
+  indexes = {'venues': venue_names, 'artists': artist_names}
+  index = indexes.get(request.args.get('type', 'venues'))
+  if index is None:
+    abort(400)
+
+  limit = min(request.args.get('limit', app.config['TYPEAHEAD_LIMIT'], type=int),
+              app.config['TYPEAHEAD_MAX_LIMIT'])
+  if limit < 1:
+    abort(400)
+  refresh_indexes()
+  matches = index.lookup(request.args.get('q', ''), limit)
+  return jsonify(data=[{'id': key, 'name': name} for key, name in matches])
+
+def browse(model, index):
+  # one page of `model` ids matching ?genre=&state=&seeking_talent= (each
+  # may repeat) with the result count for every facet value
+  filters = {facet: request.args.getlist(facet) for facet in FACETS}
+  limit = min(request.args.get('limit', app.config['BROWSE_PAGE_SIZE'], type=int),
+              app.config['BROWSE_MAX_PAGE_SIZE'])
+  after = request.args.get('after', type=int)
+  if limit < 1 or (after is not None and after < 0):
+    abort(400)
+  refresh_indexes()
+  total, ids, counts = index.browse(filters, after=after, limit=limit)
+
+  names = dict(db.session.query(model.id, model.name).filter(model.id.in_(ids))) if ids else {}
+  return jsonify(
+    count=total,
+    facets=counts,
+    data=[{'id': entity_id, 'name': names.get(entity_id)} for entity_id in ids],
+    after=ids[-1] if len(ids) == limit else None,
+  )
+
+@app.route('/venues/browse')
+def browse_venues():
+  return browse(Venue, venue_facets)
+
+def venue_view(venue_id):
+  # builds the view-model of the venue page, or None for an unknown venue
+  venue = db.session.query(*[getattr(Venue, name) for name in viewmodels.VenueView.COLUMNS]) \
+    .filter(Venue.id == venue_id) \
+    .first()
+  if venue is None:
+    return None
+
+  genres = db.session.query(Genre.name) \
+    .join(venue_genre, venue_genre.c.genre_id == Genre.id) \
+    .filter(venue_genre.c.venue_id == venue_id) \
+    .order_by(Genre.name)
+
+  # every show of the venue joined with its artist, split into past and
+  # upcoming in a single pass
+  shows = db.session.query(Show.start_time, Artist.id, Artist.name, Artist.image_link,
+                           Show.id, Show.updated_at, Artist.updated_at) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.venue_id == venue_id) \
+    .order_by(Show.start_time) \
+    .all()
+
+  now = datetime.now()
   past_shows = []
+  upcoming_shows = []
+  for start_time, artist_id, artist_name, artist_image_link, show_id, *updated_at in shows:
+    show = viewmodels.ShowSummary(
+      show_id=show_id,
+      updated_at=last_modified_of(venue.updated_at, *updated_at),
+      start_time=start_time,
+      venue_id=venue.id,
+      venue_name=venue.name,
+      venue_image_link=venue.image_link,
+      artist_id=artist_id,
+      artist_name=artist_name,
+      artist_image_link=artist_image_link,
+    )
+    (upcoming_shows if start_time > now else past_shows).append(show)
 
-  shows = Show.query.filter_by(venue_id = venue_id).filter(Show.start_time < datetime.now()).all() 
-  for show in shows:
-    dict = {}
-    dict['artist_id'] = show.artist_id
-    artist = Artist.query.get(show.artist_id)
-
-    dict['artist_name'] = artist.name
-    dict['artist_image_link'] = artist.image_link
-    dict['start_time'] = str(show.start_time)
-
-    past_shows.append(dict)
-
-  data['past_shows'] = past_shows
-
-  shows = Show.query.filter_by(venue_id = venue_id).filter(Show.start_time > datetime.now()) 
-  for show in shows:
-    dict = {}
-    dict['artist_id'] = show.artist_id
-    artist = Artist.query.get(show.artist_id)
-
-    dict['artist_name'] = artist.name
-    dict['artist_image_link'] = artist.image_link
-    dict['start_time'] = str(show.start_time)
+  # past_shows_count and upcoming_shows_count are the materialised counters
+  return viewmodels.VenueView(
+    *venue,
+    genres=tuple(name for name, in genres),
+    upcoming_shows=tuple(upcoming_shows),
+    past_shows=tuple(past_shows),
+  )
 
-    comming_shows.append(dict)
-    
-  data['upcoming_shows'] = comming_shows
+@app.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  validators = venue_page_validators(venue_id)
+  if validators is None:
+    abort(404)
+  response = not_modified(last_modified_of(*validators))
+  if response:
+    return response
 
-  data['past_shows_count'] = len(past_shows)
-  data['upcoming_shows_count'] = len(comming_shows)
-  #data.pop('_sa_instance_state')
+  data = view_cache.get(page_key('venue', venue_id, validators), lambda: venue_view(venue_id))
+  if data is None:
+    abort(404)
 
-  #data = list(filter(lambda d: d['id'] == venue_id, [data1, data2, data3]))[0]
   return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -238,7 +1034,7 @@ def show_venue(venue_id):
 
 @app.route('/venues/create', methods=['GET'])
 def create_venue_form():
-  form = VenueForm()
+  form = forms.VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
 @app.route('/venues/create', methods=['POST'])
@@ -263,12 +1059,12 @@ def create_venue_submission():
                   image_link = image_link,seeking_talent=seeking_talent,
                    website_link = website_link, seeking_description = seeking_description)
 
-    for name in genres:
-        g= Genre(name = name)
-        venue.genres.append(g)
-      
+    venue.genres = genres_by_name(genres)
+
     db.session.add(venue)
     db.session.commit()
+    venue_names.add(venue.id, venue.name)
+    venue_facets.update(venue.id, facet_values(venue))
     # on successful db insert, flash success
 
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
@@ -283,19 +1079,35 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-  # TODO: Complete this endpoint for taking a venue_id, and using
-  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+  # deletes the venue with its shows and genre associations
+  venue = Venue.query.get_or_404(venue_id)
+  artist_ids = [artist_id for artist_id, in
+                db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+  try:
+    venue.genres = []
+    Show.query.filter_by(venue_id=venue_id).delete(synchronize_session=False)
+    recount_shows(Artist, artist_ids)
+    db.session.delete(venue)
+    db.session.commit()
+  except:
+    db.session.rollback()
+    return jsonify(success=False), 500
 
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return None
+  venue_names.remove(venue_id)
+  venue_facets.remove(venue_id)
+  return jsonify(success=True)
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
+  last_modified, count = db.session.query(func.max(Artist.updated_at), func.count(Artist.id)).one()
+  response = not_modified(last_modified, count)
+  if response:
+    return response
+
   # TODO: replace with real data returned from querying the database
   data = []
   artists = Artist.query.all()
@@ -308,68 +1120,84 @@ def artists():
   return render_template('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
+@database.replica_reads
 def search_artists():
   # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
  
   search_term = request.form.get('search_term')
-  search = "%{}%".format(search_term)
-  artists = Artist.query.filter(func.lower(Artist.name).like(func.lower(search))).all()
+  artists = search.search_names(db.session, Artist, search_term, app.config['SEARCH_RESULT_LIMIT'])
 
-  response = {}
-  data = []
-  for artist in artists:
-    dict = {}
-    dict['id'] = artist.id
-    dict['name'] = artist.name
-    data.append(dict)
-    
-  response['count'] = len(data)
-  response['data'] = data
+  data = [{'id': artist_id, 'name': name} for artist_id, name in artists]
+  response = {'count': len(data), 'data': data}
   return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term'))
 
+@app.route('/artists/browse')
+def browse_artists():
+  return browse(Artist, artist_facets)
+
+def artist_view(artist_id):
+  # builds the view-model of the artist page, or None for an unknown artist
+  artist = db.session.query(*[getattr(Artist, name) for name in viewmodels.ArtistView.COLUMNS]) \
+    .filter(Artist.id == artist_id) \
+    .first()
+  if artist is None:
+    return None
+
+  genres = db.session.query(Genre.name) \
+    .join(artist_genre, artist_genre.c.genre_id == Genre.id) \
+    .filter(artist_genre.c.artist_id == artist_id) \
+    .order_by(Genre.name)
+
+  # every show of the artist joined with its venue, split into past and
+  # upcoming in a single pass
+  shows = db.session.query(Show.start_time, Venue.id, Venue.name, Venue.image_link,
+                           Show.id, Show.updated_at, Venue.updated_at) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .filter(Show.artist_id == artist_id) \
+    .order_by(Show.start_time) \
+    .all()
+
+  now = datetime.now()
+  past_shows = []
+  upcoming_shows = []
+  for start_time, venue_id, venue_name, venue_image_link, show_id, *updated_at in shows:
+    show = viewmodels.ShowSummary(
+      show_id=show_id,
+      updated_at=last_modified_of(artist.updated_at, *updated_at),
+      start_time=start_time,
+      venue_id=venue_id,
+      venue_name=venue_name,
+      venue_image_link=venue_image_link,
+      artist_id=artist.id,
+      artist_name=artist.name,
+      artist_image_link=artist.image_link,
+    )
+    (upcoming_shows if start_time > now else past_shows).append(show)
+
+  # past_shows_count and upcoming_shows_count are the materialised counters
+  return viewmodels.ArtistView(
+    *artist,
+    genres=tuple(name for name, in genres),
+    upcoming_shows=tuple(upcoming_shows),
+    past_shows=tuple(past_shows),
+  )
+
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
- 
-  artist = Artist.query.get(artist_id)
-  data = artist.__dict__
-  genre_list = []
-
-  for genre in artist.genres:
-    genre_list.append(genre.name)
+  # shows the artist page with the given artist_id
+  validators = artist_page_validators(artist_id)
+  if validators is None:
+    abort(404)
+  response = not_modified(last_modified_of(*validators))
+  if response:
+    return response
+
+  data = view_cache.get(page_key('artist', artist_id, validators), lambda: artist_view(artist_id))
+  if data is None:
+    abort(404)
 
-  data['genres'] = genre_list
-  comming_shows = []
-  past_shows = []
-  shows = Show.query.filter_by(artist_id = artist_id).filter(Show.start_time < datetime.now()).all() 
-  for show in shows:
-    dict = {}
-    dict['venue'] = show.venue_id
-    venue = Venue.query.get(show.venue_id)
-    dict['venue_name'] = venue.name
-    dict['venue_image_link'] = venue.image_link
-    dict['start_time'] = str(show.start_time)
-    past_shows.append(dict)
-
-  data['past_shows'] = past_shows
-  shows = Show.query.filter_by(artist_id = artist_id).filter(Show.start_time > datetime.now()) 
-  for show in shows:
-    dict = {}
-    dict['venue_id'] = show.venue_id
-    venue = Venue.query.get(show.venue_id)
-    dict['venue_name'] = venue.name
-    dict['venue_image_link'] = venue.image_link
-    dict['start_time'] = str(show.start_time)
-    comming_shows.append(dict)
-    
-  data['upcoming_shows'] = comming_shows 
-  data['past_shows_count'] = len(past_shows)
-  data['upcoming_shows_count'] = len(comming_shows)
-  #data.pop('_sa_instance_state')
-  #data = list(filter(lambda d: d['id'] == artist_id, [data1, data2, data3]))[0]
   return render_template('pages/show_artist.html', artist=data)
 
 #  Update
@@ -379,7 +1207,7 @@ def edit_artist(artist_id):
   
   
   artist = Artist.query.get(artist_id)
-  form = ArtistForm(obj=artist)
+  form = forms.ArtistForm(obj=artist)
   genres = [genre.name for genre in artist.genres]
   # TODO: populate form with fields from artist with ID <artist_id>
   return render_template('forms/edit_artist.html', form=form, artist=artist,genres=genres)
@@ -413,14 +1241,13 @@ def edit_artist_submission(artist_id):
   artist.website_link = website_link 
   artist.seeking_talent = seeking_talent 
   artist.seeking_description = seeking_description 
+  artist.updated_at = datetime.utcnow()
 
-  artist.genres = []
-
-  for name in genres:
-        g= Genre(name = name)
-        artist.genres.append(g)
+  artist.genres = genres_by_name(genres)
 
   db.session.commit()
+  artist_names.add(artist.id, artist.name)
+  artist_facets.update(artist.id, facet_values(artist))
 
   return redirect(url_for('show_artist', artist_id=artist_id))
 
@@ -428,7 +1255,7 @@ def edit_artist_submission(artist_id):
 def edit_venue(venue_id):
 
   venue = Venue.query.get(venue_id)
-  form = VenueForm(obj=venue)
+  form = forms.VenueForm(obj=venue)
   genres = [genre.name for genre in venue.genres ]
   return render_template('forms/edit_venue.html', form=form, venue=venue, genres=genres)
 
@@ -461,14 +1288,13 @@ def edit_venue_submission(venue_id):
   venue.website_link = website_link 
   venue.seeking_talent = seeking_talent 
   venue.seeking_description = seeking_description 
+  venue.updated_at = datetime.utcnow()
 
-  venue.genres = []
-
-  for name in genres:
-        g= Genre(name = name)
-        venue.genres.append(g)
+  venue.genres = genres_by_name(genres)
 
   db.session.commit()
+  venue_names.add(venue.id, venue.name)
+  venue_facets.update(venue.id, facet_values(venue))
 
   return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -477,7 +1303,7 @@ def edit_venue_submission(venue_id):
 
 @app.route('/artists/create', methods=['GET'])
 def create_artist_form():
-  form = ArtistForm()
+  form = forms.ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
 @app.route('/artists/create', methods=['POST'])
@@ -502,12 +1328,12 @@ def create_artist_submission():
           website_link = website_link,seeking_description = seeking_description,
           image_link = image_link)
 
-    for name in genres:
-        g= Genre(name = name)
-        artist.genres.append(g)
+    artist.genres = genres_by_name(genres)
 
     db.session.add(artist)
     db.session.commit()
+    artist_names.add(artist.id, artist.name)
+    artist_facets.update(artist.id, facet_values(artist))
     # on successful db insert, flash success
     flash('Artist ' + request.form['name'] + ' was successfully listed!') 
 
@@ -523,35 +1349,86 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+def encode_cursor(start_time, show_id):
+  return '{}_{}'.format(start_time.strftime('%Y%m%d%H%M%S%f'), show_id)
+
+def decode_cursor(cursor):
+  # returns the (start_time, id) pair encoded by encode_cursor
+  try:
+    start_time, show_id = cursor.split('_')
+    return datetime.strptime(start_time, '%Y%m%d%H%M%S%f'), int(show_id)
+  except ValueError:
+    abort(400)
+
 @app.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  #       num_shows should be aggregated based on number of upcoming shows per venue.
+  # displays one page of shows at /shows, upcoming shows by default.
+  # Pages are walked with a keyset cursor on (start_time, id) so every page
+  # costs the same no matter how deep into the listing it is.
+  # shows are only deleted along with their venue, which recounts the
+  # artists' counters and so moves their updated_at
+  validators = db.session.query(
+    db.session.query(func.max(Show.updated_at)).as_scalar(),
+    db.session.query(func.max(Venue.updated_at)).as_scalar(),
+    db.session.query(func.max(Artist.updated_at)).as_scalar(),
+  ).one()
+  response = not_modified(last_modified_of(*validators))
+  if response:
+    return response
+
+  past = request.args.get('when') == 'past'
+  page_size = min(request.args.get('page_size', app.config['SHOWS_PAGE_SIZE'], type=int),
+                  app.config['SHOWS_MAX_PAGE_SIZE'])
+  if page_size < 1:
+    abort(400)
+
+  query = db.session.query(Show.id, Show.start_time, Venue.id, Venue.name, Venue.image_link,
+                           Artist.id, Artist.name, Artist.image_link,
+                           Show.updated_at, Venue.updated_at, Artist.updated_at) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id)
+
+  now = datetime.now()
+  key = db.tuple_(Show.start_time, Show.id)
+  cursor = request.args.get('after')
+  if past:
+    query = query.filter(Show.start_time <= now).order_by(Show.start_time.desc(), Show.id.desc())
+    if cursor:
+      query = query.filter(key < decode_cursor(cursor))
+  else:
+    query = query.filter(Show.start_time > now).order_by(Show.start_time, Show.id)
+    if cursor:
+      query = query.filter(key > decode_cursor(cursor))
+
+  # one extra row tells us whether there is a next page
+  rows = query.limit(page_size + 1).all()
 
   data = []
-
-  shows =Show.query.all()
-
-  for show in shows:
-    show_dict = {}
-    venue = Venue.query.get(show.venue_id)
-    artist = Artist.query.get(show.artist_id)
-    
-    show_dict['venue_id'] = show.venue_id
-    show_dict['venue_name'] = venue.name
-    show_dict['artist_id'] = show.artist_id
-    show_dict['artist_name'] = artist.name
-    show_dict['artist_image_link'] = artist.image_link
-    show_dict['start_time'] = str(show.start_time)
-    data.append(show_dict)
-
-  return render_template('pages/shows.html', shows=data)
+  for show_id, start_time, venue_id, venue_name, venue_image_link, artist_id, artist_name, artist_image_link, *updated_at in rows[:page_size]:
+    data.append(viewmodels.ShowSummary(
+      show_id=show_id,
+      updated_at=last_modified_of(*updated_at),
+      start_time=start_time,
+      venue_id=venue_id,
+      venue_name=venue_name,
+      venue_image_link=venue_image_link,
+      artist_id=artist_id,
+      artist_name=artist_name,
+      artist_image_link=artist_image_link,
+    ))
+
+  next_url = None
+  if len(rows) > page_size:
+    show_id, start_time = rows[page_size - 1][:2]
+    next_url = url_for('shows', when='past' if past else None, page_size=request.args.get('page_size'),
+                       after=encode_cursor(start_time, show_id))
+
+  return render_template('pages/shows.html', shows=data, past=past, next_url=next_url)
 
 @app.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
-  form = ShowForm()
+  form = forms.ShowForm()
   return render_template('forms/new_show.html', form=form)
 
 @app.route('/shows/create', methods=['POST'])
@@ -561,11 +1438,12 @@ def create_show_submission():
   try:
     artist_id = request.form.get('artist_id')
     venue_id = request.form.get('venue_id')
-    start_time = request.form.get('start_time')
+    start_time = dateutil_parser.parse(request.form.get('start_time'))
     
     show = Show(artist_id = artist_id, venue_id = venue_id, start_time = start_time )
 
     db.session.add(show)
+    count_show(show)
     db.session.commit()
     # on successful db insert, flash success
     flash('Show was successfully listed!')
@@ -579,8 +1457,189 @@ def create_show_submission():
   finally:
     return render_template('pages/home.html')
 
+#  API
+#  ----------------------------------------------------------------
+
+# /api/v1 serves JSON built from Core select() projections: only the
+# requested columns are fetched and rows become dicts directly, without
+# hydrating ORM objects. Lists are keyset-paginated like /shows; ?fields=
+# picks the fields returned.
+
+def api_columns(resource):
+  # field name -> column expression, and the columns the list is keyed on
+  if resource == 'shows':
+    return {
+      'id': Show.id,
+      'start_time': Show.start_time,
+      'artist_id': Show.artist_id,
+      'artist_name': Artist.name,
+      'artist_image_link': Artist.image_link,
+      'venue_id': Show.venue_id,
+      'venue_name': Venue.name,
+      'venue_image_link': Venue.image_link,
+    }, ('start_time', 'id')
+  model = {'venues': Venue, 'artists': Artist}[resource]
+  columns = {name: getattr(model, name) for name in EXPORT_COLUMNS[resource]}
+  columns.update(upcoming_shows_count=model.upcoming_shows_count, past_shows_count=model.past_shows_count)
+  return columns, ('id',)
+
+def api_error(status, message):
+  return jsonify({'error': message}), status
+
+def api_fields(resource, columns):
+  # the fields named in ?fields=, or all of them; None if one is unknown
+  available = list(columns) + ([] if resource == 'shows' else ['genres'])
+  if not request.args.get('fields'):
+    return available
+  fields = [field for field in request.args['fields'].split(',') if field]
+  if not fields or any(field not in available for field in fields):
+    return None
+  return fields
+
+def api_genres(resource, ids):
+  # entity id -> sorted genre names, in one query for a page of entities
+  association = venue_genre if resource == 'venues' else artist_genre
+  foreign_key = association.c.venue_id if resource == 'venues' else association.c.artist_id
+  query = db.select([foreign_key, Genre.name]) \
+    .select_from(association.join(Genre.__table__)) \
+    .where(foreign_key.in_(ids)) \
+    .order_by(Genre.name)
+  genres = {entity_id: [] for entity_id in ids}
+  for entity_id, name in db.session.execute(query):
+    genres[entity_id].append(name)
+  return genres
+
+def api_rows(resource, fields, where, order_by=(), limit=None):
+  # fetches `fields` (plus the key columns) and returns them as dicts
+  columns, key = api_columns(resource)
+  names = [name for name in fields if name in columns]
+  selected = names + [name for name in key if name not in names]
+  query = db.select([columns[name].label(name) for name in selected])
+  if resource == 'shows':
+    query = query.select_from(Show.__table__.join(Artist.__table__).join(Venue.__table__))
+  query = query.where(db.and_(*where)).order_by(*order_by)
+  if limit is not None:
+    query = query.limit(limit)
+
+  rows = db.session.execute(query).fetchall()
+  items = []
+  for row in rows:
+    item = {}
+    for name in names:
+      value = row[name]
+      item[name] = value.isoformat() if isinstance(value, datetime) else value
+    items.append(item)
+  if 'genres' in fields and rows:
+    genres = api_genres(resource, [row['id'] for row in rows])
+    for row, item in zip(rows, items):
+      item['genres'] = genres[row['id']]
+  return rows, items
+
+# the query arguments of api_list carried over to the next page
+API_LIST_ARGS = ('limit', 'fields', 'when', 'venue_id', 'artist_id')
+
+@app.route('/api/v1/<any(venues, artists, shows):resource>')
+def api_list(resource):
+  # ?limit= items after the ?after= cursor; shows also take ?when=past or
+  # upcoming, ?venue_id= and ?artist_id=
+  columns, key = api_columns(resource)
+  fields = api_fields(resource, columns)
+  if fields is None:
+    return api_error(400, 'unknown field')
+  limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+  if not 1 <= limit <= app.config['API_MAX_PAGE_SIZE']:
+    return api_error(400, 'limit must be between 1 and {}'.format(app.config['API_MAX_PAGE_SIZE']))
+
+  cursor = request.args.get('after')
+  descending = False
+  where = []
+  if resource == 'shows':
+    when = request.args.get('when')
+    descending = when == 'past'
+    if when == 'past':
+      where.append(Show.start_time <= datetime.now())
+    elif when == 'upcoming':
+      where.append(Show.start_time > datetime.now())
+    for name in ('venue_id', 'artist_id'):
+      value = request.args.get(name, type=int)
+      if value is not None:
+        where.append(columns[name] == value)
+    position = db.tuple_(Show.start_time, Show.id)
+    after = decode_cursor(cursor) if cursor else None
+  else:
+    position = columns['id']
+    after = request.args.get('after', type=int)
+    if cursor and after is None:
+      return api_error(400, 'invalid cursor')
+  if after is not None:
+    where.append(position < after if descending else position > after)
+
+  order_by = [columns[name].desc() if descending else columns[name] for name in key]
+  # one extra row tells us whether there is a next page
+  rows, items = api_rows(resource, fields, where, order_by, limit + 1)
+
+  next_url = None
+  if len(rows) > limit:
+    last = rows[limit - 1]
+    cursor = encode_cursor(last['start_time'], last['id']) if resource == 'shows' else last['id']
+    params = {name: request.args[name] for name in API_LIST_ARGS if name in request.args}
+    next_url = url_for('api_list', resource=resource, after=cursor, **params)
+  return jsonify({'data': items[:limit], 'next': next_url})
+
+@app.route('/api/v1/<any(venues, artists, shows):resource>/<int:item_id>')
+def api_item(resource, item_id):
+  columns, key = api_columns(resource)
+  fields = api_fields(resource, columns)
+  if fields is None:
+    return api_error(400, 'unknown field')
+  rows, items = api_rows(resource, fields, [columns['id'] == item_id])
+  if not items:
+    return api_error(404, 'not found')
+  return jsonify({'data': items[0]})
+
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):kind>.<any(csv, jsonl):format>')
+def export_catalog(kind, format):
+  # ?since=&until=&city=&state= filter, ?gzip=1 compresses
+  try:
+    filters = export_filters(request.args)
+  except ValueError:
+    abort(400)
+  compress = request.args.get('gzip') == '1'
+  columns, rows = export_rows(kind, **filters)
+  filename = '{}.{}{}'.format(kind, format, '.gz' if compress else '')
+  mimetype = 'application/gzip' if compress else export.FORMATS[format][0]
+  return Response(stream_with_context(export.stream(columns, rows, format, compress)), mimetype=mimetype,
+                  headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+#  Status
+#  ----------------------------------------------------------------
+
+@app.route('/status/db-pool')
+def db_pool_status():
+  # checkout counts and latency per engine, labelled by bind, plus occupancy
+  # for queue pools
+  return jsonify(db.pool_stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+  if app_metrics is None:
+    abort(404)
+  body, content_type = app_metrics.exposition()
+  return Response(body, content_type=content_type)
+
+@app.errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(400, 'bad request')
+    return error
+
 @app.errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return api_error(404, 'not found')
     return render_template('errors/404.html'), 404
 
 @app.errorhandler(500)
@@ -598,6 +1657,9 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+if app.config['TEMPLATE_WARMUP']:
+  warm_up_templates()
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,147 @@
+#----------------------------------------------------------------------------#
+# /api/v1 lists: per-request allocations and time, Core projections vs ORM.
+#
+#   python benchmarks/api_allocations.py --venues 20000 --shows 60000 --limit 500
+#
+# Seeds a throwaway SQLite database and builds the same JSON page of venues
+# (with genres) and of shows (with artist and venue names) twice: through
+# the API views, which select plain rows, and by hydrating ORM objects the
+# way the HTML handlers do. Peak traced memory is measured with tracemalloc.
+#----------------------------------------------------------------------------#
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other']
+
+
+def parse_args():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--venues', type=int, default=20000)
+  parser.add_argument('--artists', type=int, default=2000)
+  parser.add_argument('--shows', type=int, default=60000)
+  parser.add_argument('--limit', type=int, default=500)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=1)
+  return parser.parse_args()
+
+
+def seed(fyyur, args):
+  rng = random.Random(args.seed)
+  now = datetime.now()
+  db = fyyur.db
+  db.session.bulk_insert_mappings(fyyur.Genre, [{'id': i, 'name': name} for i, name in enumerate(GENRES, 1)])
+  db.session.bulk_insert_mappings(fyyur.Venue, [
+    {'id': i, 'name': 'Venue %d' % i, 'city': 'City %d' % (i % 200), 'state': 'CA',
+     'address': '%d Main St' % i, 'phone': '555-0100', 'image_link': 'https://img/%d' % i,
+     'facebook_link': 'https://fb/%d' % i, 'seeking_talent': bool(i % 2)}
+    for i in range(1, args.venues + 1)
+  ])
+  db.session.execute(fyyur.venue_genre.insert(), [
+    {'venue_id': i, 'genre_id': genre_id}
+    for i in range(1, args.venues + 1) for genre_id in rng.sample(range(1, len(GENRES) + 1), 3)
+  ])
+  db.session.bulk_insert_mappings(fyyur.Artist, [
+    {'id': i, 'name': 'Artist %d' % i, 'image_link': 'https://img/a%d' % i} for i in range(1, args.artists + 1)
+  ])
+  db.session.bulk_insert_mappings(fyyur.Show, [
+    {
+      'artist_id': rng.randint(1, args.artists),
+      'venue_id': rng.randint(1, args.venues),
+      'start_time': now + timedelta(days=rng.randint(-365, 365)),
+    }
+    for _ in range(args.shows)
+  ])
+  db.session.commit()
+
+
+def orm_venues(fyyur, limit):
+  from sqlalchemy.orm import selectinload
+  venues = fyyur.Venue.query.options(selectinload(fyyur.Venue.genres)) \
+    .order_by(fyyur.Venue.id).limit(limit + 1).all()
+  data = []
+  for venue in venues[:limit]:
+    item = {column.key: getattr(venue, column.key) for column in venue.__mapper__.column_attrs}
+    del item['updated_at']
+    item['genres'] = sorted(genre.name for genre in venue.genres)
+    data.append(item)
+  return fyyur.jsonify({'data': data, 'next': None})
+
+
+def orm_shows(fyyur, limit):
+  from sqlalchemy.orm import joinedload
+  Show = fyyur.Show
+  shows = Show.query.options(joinedload(Show.artist), joinedload(Show.venue)) \
+    .order_by(Show.start_time, Show.id).limit(limit + 1).all()
+  data = [{
+    'id': show.id,
+    'start_time': show.start_time.isoformat(),
+    'artist_id': show.artist_id,
+    'artist_name': show.artist.name,
+    'artist_image_link': show.artist.image_link,
+    'venue_id': show.venue_id,
+    'venue_name': show.venue.name,
+    'venue_image_link': show.venue.image_link,
+  } for show in shows[:limit]]
+  return fyyur.jsonify({'data': data, 'next': None})
+
+
+def measure(fyyur, path, view, repeat):
+  # (peak traced KiB of one request, mean seconds per request)
+  def run():
+    with fyyur.app.test_request_context(path):
+      response = view()
+      response.get_data()
+      fyyur.db.session.remove()
+
+  run()
+  tracemalloc.start()
+  run()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  start = time.perf_counter()
+  for _ in range(repeat):
+    run()
+  return peak / 1024, (time.perf_counter() - start) / repeat
+
+
+def main():
+  args = parse_args()
+  handle, path = tempfile.mkstemp(suffix='.db')
+  os.close(handle)
+  os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+  import app as fyyur
+
+  with fyyur.app.app_context():
+    fyyur.db.create_all()
+    seed(fyyur, args)
+
+  print('venues=%d shows=%d limit=%d' % (args.venues, args.shows, args.limit))
+  for resource, orm_view in (('venues', orm_venues), ('shows', orm_shows)):
+    url = '/api/v1/%s?limit=%d' % (resource, args.limit)
+    with fyyur.app.test_request_context(url):
+      api_data = fyyur.api_list(resource).get_json()['data']
+      orm_data = orm_view(fyyur, args.limit).get_json()['data']
+    assert api_data == orm_data, '%s: API and ORM pages differ' % resource
+
+    api_peak, api_seconds = measure(fyyur, url, lambda: fyyur.api_list(resource), args.repeat)
+    orm_peak, orm_seconds = measure(fyyur, url, lambda: orm_view(fyyur, args.limit), args.repeat)
+    print('%-7s ORM   peak %8.0f KiB  %7.1f ms' % (resource, orm_peak, orm_seconds * 1000))
+    print('%-7s Core  peak %8.0f KiB  %7.1f ms' % (resource, api_peak, api_seconds * 1000))
+  os.remove(path)
+
+
+if __name__ == '__main__':
+  main()
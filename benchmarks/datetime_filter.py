@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------------#
+# datetime template filter: per-call cost on 100k timestamps.
+#
+#   python benchmarks/datetime_filter.py --count 100000 --distinct 5000
+#
+# Compares the original filter (str() in the view, dateutil parse and
+# babel.dates.format_datetime per call) with the current one on datetime
+# objects, with and without the memo. --distinct controls how many distinct
+# timestamps the sample repeats, as show pages do.
+#----------------------------------------------------------------------------#
+import argparse
+import functools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import babel.dates
+import dateutil.parser
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format)
+
+
+def measure(label, function, values, baseline=None):
+  start = time.perf_counter()
+  for value in values:
+    function(value, 'full')
+  per_call = (time.perf_counter() - start) / len(values) * 1e6
+  speedup = '' if baseline is None else '  (%.1fx)' % (baseline / per_call)
+  print('%-28s %8.2f us/call%s' % (label, per_call, speedup))
+  return per_call
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--count', type=int, default=100000)
+  parser.add_argument('--distinct', type=int, default=5000)
+  parser.add_argument('--seed', type=int, default=1)
+  args = parser.parse_args()
+
+  import app as fyyur
+
+  rng = random.Random(args.seed)
+  base = datetime(2026, 1, 1, 20, 0)
+  distinct = [base + timedelta(minutes=30 * rng.randint(0, 20000)) for _ in range(args.distinct)]
+  values = [rng.choice(distinct) for _ in range(args.count)]
+
+  for value in distinct[:100]:
+    assert fyyur.format_datetime(value, 'full') == legacy_format_datetime(str(value), 'full')
+
+  strings = [str(value) for value in values]
+  baseline = measure('legacy (str, parse, babel)', legacy_format_datetime, strings)
+  measure('datetime, compiled pattern', fyyur.format_datetime, values, baseline)
+  memo = functools.lru_cache(fyyur.app.config['DATETIME_FILTER_MEMO_SIZE'])(fyyur.format_datetime)
+  measure('datetime, memoised', memo, values, baseline)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,393 @@
+#----------------------------------------------------------------------------#
+# Every route: latency percentiles, SQL statements and peak memory.
+#
+#   python benchmarks/routes.py --venues 20000 --artists 10000 --shows 1000000 -o run.json
+#   python benchmarks/routes.py --database-url postgresql://localhost/fyyur_bench --reuse
+#   python benchmarks/routes.py --compare run.json
+#
+# Seeds a deterministic synthetic catalog (a throwaway SQLite file unless
+# --database-url is given): shows are spread over venues and artists with a
+# Zipf distribution, so a few have thousands of shows and most have a
+# handful. Pages are requested with ids drawn from the same distribution,
+# like real traffic, so popular pages hit the caches. Each case is driven
+# through the Flask test client; latency and statement counts come from a
+# plain pass and peak memory from a separate traced pass. Read-only routes
+# run first, then the ones that write. Writes only run against the
+# temporary database, or a --database-url seeded by this run when --writes
+# is given, so a catalog kept for --reuse is never modified and every run
+# measures the same data. The JSON report lists any route the suite does
+# not cover and the cases it skipped; --compare prints the change against an
+# earlier report.
+#----------------------------------------------------------------------------#
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bulk_import import batches, insert_rows
+
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other']
+STATES = ['CA', 'NY', 'TX', 'IL', 'WA', 'FL', 'LA', 'TN', 'GA', 'CO']
+SEARCH_TERMS = ['venue 1', 'artist 42', 'hall', 'the', 'city 7', 'zz']
+
+
+def parse_args():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--database-url', default=None, help='Database to seed; a temporary SQLite file by default.')
+  parser.add_argument('--reuse', action='store_true', help='Benchmark the data already in --database-url.')
+  parser.add_argument('--venues', type=int, default=5000)
+  parser.add_argument('--artists', type=int, default=3000)
+  parser.add_argument('--shows', type=int, default=100000)
+  parser.add_argument('--cities', type=int, default=200)
+  parser.add_argument('--zipf', type=float, default=1.1, help='Exponent of the shows per venue/artist skew.')
+  parser.add_argument('--batch-size', type=int, default=50000, help='Rows per insert while seeding.')
+  parser.add_argument('--requests', type=int, default=50, help='Timed requests per case.')
+  parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per case.')
+  parser.add_argument('--memory-requests', type=int, default=3, help='Traced requests per case.')
+  parser.add_argument('--only', default=None, help='Comma-separated case names to run.')
+  parser.add_argument('--writes', action='store_true',
+                      help='Also run the create, edit and delete cases against --database-url.')
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--output', '-o', default='-', help='Where to write the JSON report.')
+  parser.add_argument('--compare', default=None, help='An earlier report to compare against.')
+  return parser.parse_args()
+
+
+#  Dataset
+#  ----------------------------------------------------------------
+
+def zipf_cum_weights(n, s):
+  return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+class Popularity:
+  # ids 1..n ranked in a seeded random order and drawn with Zipf weights,
+  # so the popular ids are scattered rather than the lowest ones
+
+  def __init__(self, rng, n, s):
+    self.ids = list(range(1, n + 1))
+    rng.shuffle(self.ids)
+    self.cum_weights = zipf_cum_weights(n, s)
+
+  def draw(self, rng, k=1):
+    return rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+  def least_popular(self, k):
+    return self.ids[-k:]
+
+def seed(fyyur, args, rng, venues, artists, anchor):
+  # inserts the catalog in batches; timestamps are relative to `anchor`, so
+  # the past/upcoming split is the same on every run
+  db = fyyur.db
+
+  def insert(table, rows):
+    for _, batch in batches(rows, args.batch_size):
+      with db.engine.begin() as connection:
+        insert_rows(connection, table, batch)
+
+  insert(fyyur.Genre.__table__, [{'id': i, 'name': name} for i, name in enumerate(GENRES, 1)])
+  for model, association, key, count in ((fyyur.Venue, fyyur.venue_genre, 'venue_id', args.venues),
+                                         (fyyur.Artist, fyyur.artist_genre, 'artist_id', args.artists)):
+    label = model.__name__
+    insert(model.__table__, ({
+      'id': i,
+      'name': '{} {}'.format(label, i),
+      'city': 'City {}'.format(min(int(rng.paretovariate(1.2)), args.cities)),
+      'state': rng.choice(STATES),
+      'phone': '555-01{:02d}'.format(i % 100),
+      'image_link': 'https://img.example.com/{}/{}.jpg'.format(label.lower(), i),
+      'facebook_link': 'https://www.facebook.com/{}{}'.format(label.lower(), i),
+      'website_link': 'https://{}{}.example.com'.format(label.lower(), i),
+      'seeking_talent': i % 3 == 0,
+      'seeking_description': 'Looking for local acts' if i % 3 == 0 else None,
+      'upcoming_shows_count': 0,
+      'past_shows_count': 0,
+      'updated_at': anchor,
+      **({'address': '{} Main St'.format(i)} if model is fyyur.Venue else {}),
+    } for i in range(1, count + 1)))
+    insert(association, ({key: i, 'genre_id': genre_id}
+                         for i in range(1, count + 1)
+                         for genre_id in rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 3))))
+
+  def shows():
+    show_id = 1
+    while show_id <= args.shows:
+      n = min(args.batch_size, args.shows - show_id + 1)
+      for venue_id, artist_id in zip(venues.draw(rng, n), artists.draw(rng, n)):
+        yield {
+          'id': show_id,
+          'venue_id': venue_id,
+          'artist_id': artist_id,
+          'start_time': anchor + timedelta(days=rng.randint(-730, 365), hours=rng.choice((18, 19, 20, 21))),
+          'updated_at': anchor,
+        }
+        show_id += 1
+  insert(fyyur.Show.__table__, shows())
+
+  with fyyur.app.app_context():
+    fyyur.refresh_show_counters()
+    if db.engine.dialect.name == 'postgresql':
+      # explicit ids leave the sequences behind
+      for table in ('venue', 'artist', 'show', 'genre'):
+        db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), (SELECT max(id) FROM {0}))"
+                           .format(db.engine.dialect.identifier_preparer.quote(table)))
+      db.session.commit()
+
+def catalog_size(fyyur):
+  with fyyur.app.app_context():
+    return {name: model.query.count()
+            for name, model in (('venues', fyyur.Venue), ('artists', fyyur.Artist), ('shows', fyyur.Show))}
+
+
+#  Cases
+#  ----------------------------------------------------------------
+
+def venue_form(rng, i):
+  return {'name': 'Bench Venue {}'.format(i), 'city': 'City 1', 'state': rng.choice(STATES),
+          'address': '{} Bench St'.format(i), 'phone': '555-0199', 'genres': rng.sample(GENRES, 2),
+          'facebook_link': 'https://www.facebook.com/bench', 'image_link': '', 'website_link': '',
+          'seeking_talent': 'y', 'seeking_description': 'Bench'}
+
+def artist_form(rng, i):
+  form = venue_form(rng, i)
+  del form['address']
+  form['name'] = 'Bench Artist {}'.format(i)
+  return form
+
+def cases(rng, venues, artists, anchor, delete_ids):
+  # (name, endpoint, writes, request builder); a builder takes the request
+  # number and returns (method, path, form data)
+  counter = itertools.count()
+  genre = lambda: quote(rng.choice(GENRES))
+  venue = lambda: venues.draw(rng)[0]
+  artist = lambda: artists.draw(rng)[0]
+  get = lambda path: ('GET', path, None)
+
+  reads = [
+    ('index', 'index', lambda i: get('/')),
+    ('venues', 'venues', lambda i: get('/venues')),
+    ('artists', 'artists', lambda i: get('/artists')),
+    ('shows', 'shows', lambda i: get('/shows')),
+    ('shows_past', 'shows', lambda i: get('/shows?when=past&page_size=100')),
+    ('show_venue', 'show_venue', lambda i: get('/venues/{}'.format(venue()))),
+    ('show_artist', 'show_artist', lambda i: get('/artists/{}'.format(artist()))),
+    ('browse_venues', 'browse_venues', lambda i: get('/venues/browse?genre={}&state={}'.format(genre(), rng.choice(STATES)))),
+    ('browse_artists', 'browse_artists', lambda i: get('/artists/browse?genre={}'.format(genre()))),
+    ('search_venues', 'search_venues', lambda i: ('POST', '/venues/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+    ('search_artists', 'search_artists', lambda i: ('POST', '/artists/search', {'search_term': rng.choice(SEARCH_TERMS)})),
+    ('typeahead', 'search_typeahead', lambda i: get('/search/typeahead?type={}&q={}'.format(
+      rng.choice(('venues', 'artists')), quote(rng.choice(SEARCH_TERMS)[:rng.randint(1, 5)])))),
+    ('api_list', 'api_list', lambda i: get('/api/v1/{}?limit=100'.format(rng.choice(('venues', 'artists', 'shows'))))),
+    ('api_item', 'api_item', lambda i: get('/api/v1/venues/{}'.format(venue()))),
+    ('export', 'export_catalog', lambda i: get('/export/venues.csv?city={}'.format(quote('City 1')))),
+    ('export_shows', 'export_catalog', lambda i: get('/export/shows.jsonl?gzip=1&since={}&until={}'.format(
+      anchor.date().isoformat(), (anchor + timedelta(days=7)).date().isoformat()))),
+    ('create_venue_form', 'create_venue_form', lambda i: get('/venues/create')),
+    ('create_artist_form', 'create_artist_form', lambda i: get('/artists/create')),
+    ('create_show_form', 'create_shows', lambda i: get('/shows/create')),
+    ('edit_venue', 'edit_venue', lambda i: get('/venues/{}/edit'.format(venue()))),
+    ('edit_artist', 'edit_artist', lambda i: get('/artists/{}/edit'.format(artist()))),
+    ('db_pool_status', 'db_pool_status', lambda i: get('/status/db-pool')),
+    ('metrics', 'prometheus_metrics', lambda i: get('/metrics')),
+    ('static', 'static', lambda i: get('/static/css/main.css')),
+  ]
+  writes = [
+    ('create_venue', 'create_venue_submission', lambda i: ('POST', '/venues/create', venue_form(rng, next(counter)))),
+    ('create_artist', 'create_artist_submission', lambda i: ('POST', '/artists/create', artist_form(rng, next(counter)))),
+    ('create_show', 'create_show_submission', lambda i: ('POST', '/shows/create', {
+      'venue_id': venue(), 'artist_id': artist(),
+      'start_time': (anchor + timedelta(days=rng.randint(1, 90))).strftime('%Y-%m-%d %H:%M:%S')})),
+    ('edit_venue_submission', 'edit_venue_submission', lambda i: (
+      'POST', '/venues/{}/edit'.format(venue()), venue_form(rng, next(counter)))),
+    ('edit_artist_submission', 'edit_artist_submission', lambda i: (
+      'POST', '/artists/{}/edit'.format(artist()), artist_form(rng, next(counter)))),
+    ('delete_venue', 'delete_venue', lambda i: ('DELETE', '/venues/{}'.format(delete_ids.pop()), None)),
+  ]
+  return [(name, endpoint, False, build) for name, endpoint, build in reads] + \
+         [(name, endpoint, True, build) for name, endpoint, build in writes]
+
+
+#  Measurement
+#  ----------------------------------------------------------------
+
+class StatementCounter:
+  # counts statements on every engine, streamed response bodies included
+
+  def __init__(self):
+    self.count = 0
+
+  def install(self):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'after_cursor_execute', self.record)
+
+  def record(self, *args):
+    self.count += 1
+
+def percentile(values, p):
+  # nearest rank
+  ordered = sorted(values)
+  return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def run_case(client, statements, build, args, writes):
+  def request(i):
+    method, path, data = build(i)
+    response = client.open(path, method=method, data=data)
+    response.get_data()
+    response.close()
+    return response.status_code
+
+  timed = args.requests if not writes else max(1, args.requests // 5)
+  for i in range(args.warmup if not writes else 0):
+    request(i)
+
+  latencies = []
+  queries = []
+  status = {}
+  for i in range(timed):
+    before = statements.count
+    started = time.perf_counter()
+    code = request(i)
+    latencies.append((time.perf_counter() - started) * 1000)
+    queries.append(statements.count - before)
+    status[str(code)] = status.get(str(code), 0) + 1
+
+  peaks = []
+  for i in range(args.memory_requests if not writes else 1):
+    tracemalloc.start()
+    request(i)
+    peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+    tracemalloc.stop()
+
+  return {
+    'requests': timed,
+    'status': status,
+    'latency_ms': {
+      'p50': round(percentile(latencies, 50), 3),
+      'p95': round(percentile(latencies, 95), 3),
+      'p99': round(percentile(latencies, 99), 3),
+      'mean': round(sum(latencies) / len(latencies), 3),
+      'max': round(max(latencies), 3),
+    },
+    'queries': {'p50': percentile(queries, 50), 'max': max(queries)},
+    'peak_memory_kib': round(max(peaks), 1),
+  }
+
+
+def compare(report, baseline):
+  print('%-24s %22s %22s %14s %18s' % ('case', 'p50 ms', 'p95 ms', 'queries', 'peak KiB'), file=sys.stderr)
+  for name, result in report['routes'].items():
+    before = baseline.get('routes', {}).get(name)
+    if before is None:
+      print('%-24s (new)' % name, file=sys.stderr)
+      continue
+    cells = []
+    for old, new in ((before['latency_ms']['p50'], result['latency_ms']['p50']),
+                     (before['latency_ms']['p95'], result['latency_ms']['p95'])):
+      cells.append('%8.2f -> %8.2f %+4.0f%%' % (old, new, (new - old) / old * 100 if old else 0))
+    cells.append('%5d -> %5d' % (before['queries']['p50'], result['queries']['p50']))
+    cells.append('%7.0f -> %7.0f' % (before['peak_memory_kib'], result['peak_memory_kib']))
+    print('%-24s %s' % (name, ' '.join(cells)), file=sys.stderr)
+
+
+def main():
+  args = parse_args()
+  path = None
+  if args.database_url is None:
+    if args.reuse:
+      sys.exit('--reuse needs --database-url')
+    args.writes = True
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    args.database_url = 'sqlite:///' + path
+  elif args.reuse and args.writes:
+    sys.exit('--writes would change the reused catalog; seed a fresh database to measure writes')
+  os.environ['DATABASE_URL'] = args.database_url
+
+  import app as fyyur
+  fyyur.app.config['WTF_CSRF_ENABLED'] = False
+  fyyur.app.logger.setLevel(logging.WARNING)
+
+  rng = random.Random(args.seed)
+  anchor = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+  seed_seconds = None
+  if not args.reuse:
+    with fyyur.app.app_context():
+      fyyur.db.create_all()
+    started = time.perf_counter()
+    seed(fyyur, args, random.Random(args.seed), Popularity(random.Random(args.seed), args.venues, args.zipf),
+         Popularity(random.Random(args.seed + 1), args.artists, args.zipf), anchor)
+    seed_seconds = round(time.perf_counter() - started, 2)
+  size = catalog_size(fyyur)
+  venues = Popularity(random.Random(args.seed), size['venues'], args.zipf)
+  artists = Popularity(random.Random(args.seed + 1), size['artists'], args.zipf)
+
+  statements = StatementCounter()
+  statements.install()
+  client = fyyur.app.test_client()
+  # the first request builds the in-memory indexes
+  started = time.perf_counter()
+  client.get('/').close()
+  first_request = round((time.perf_counter() - started) * 1000, 3)
+
+  suite = cases(rng, venues, artists, anchor, venues.least_popular(args.requests))
+  only = set(args.only.split(',')) if args.only else None
+  routes = {}
+  skipped = []
+  for name, endpoint, writes, build in suite:
+    if only is not None and name not in only:
+      continue
+    if writes and not args.writes:
+      skipped.append(name)
+      continue
+    routes[name] = dict(endpoint=endpoint, **run_case(client, statements, build, args, writes))
+    print('%-24s p50 %8.2f ms  p99 %8.2f ms  %4d queries' % (
+      name, routes[name]['latency_ms']['p50'], routes[name]['latency_ms']['p99'], routes[name]['queries']['p50']),
+      file=sys.stderr)
+
+  covered = set(endpoint for _, endpoint, _, _ in suite)
+  report = {
+    'dataset': dict(size, zipf=args.zipf, seed=args.seed, seed_seconds=seed_seconds),
+    'environment': {
+      'python': platform.python_version(),
+      'database': fyyur.db.engine.dialect.name,
+      'first_request_ms': first_request,
+    },
+    'routes': routes,
+    'skipped': skipped,
+    'uncovered': sorted(rule.endpoint for rule in fyyur.app.url_map.iter_rules() if rule.endpoint not in covered),
+  }
+  if skipped:
+    print('skipped (writes): ' + ', '.join(skipped), file=sys.stderr)
+  if report['uncovered']:
+    print('not covered: ' + ', '.join(report['uncovered']), file=sys.stderr)
+
+  output = json.dumps(report, indent=2)
+  if args.output == '-':
+    print(output)
+  else:
+    with open(args.output, 'w') as f:
+      f.write(output + '\n')
+  if args.compare:
+    with open(args.compare) as f:
+      compare(report, json.load(f))
+  if path:
+    os.remove(path)
+
+
+if __name__ == '__main__':
+  main()
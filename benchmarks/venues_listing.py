@@ -0,0 +1,119 @@
+#----------------------------------------------------------------------------#
+# /venues listing: query count and timing on a seeded catalog.
+#
+#   python benchmarks/venues_listing.py --venues 20000 --shows 60000
+#
+# Seeds a throwaway SQLite database, checks that the listing runs a constant
+# number of statements and compares it with the previous per-area /
+# per-venue implementation.
+#----------------------------------------------------------------------------#
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--venues', type=int, default=20000)
+  parser.add_argument('--artists', type=int, default=2000)
+  parser.add_argument('--shows', type=int, default=60000)
+  parser.add_argument('--areas', type=int, default=200)
+  parser.add_argument('--seed', type=int, default=1)
+  return parser.parse_args()
+
+
+def seed(db, Venue, Artist, Show, args):
+  rng = random.Random(args.seed)
+  now = datetime.now()
+  db.session.bulk_insert_mappings(Venue, [
+    {'id': i, 'name': 'Venue %d' % i, 'city': 'City %d' % (i % args.areas), 'state': 'CA'}
+    for i in range(1, args.venues + 1)
+  ])
+  db.session.bulk_insert_mappings(Artist, [
+    {'id': i, 'name': 'Artist %d' % i} for i in range(1, args.artists + 1)
+  ])
+  db.session.bulk_insert_mappings(Show, [
+    {
+      'artist_id': rng.randint(1, args.artists),
+      'venue_id': rng.randint(1, args.venues),
+      'start_time': now + timedelta(days=rng.randint(-365, 365)),
+    }
+    for _ in range(args.shows)
+  ])
+  db.session.commit()
+
+
+def legacy_areas(db, Venue, Show):
+  data = []
+  venue_groups = db.session.query(Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
+  for city, state in venue_groups:
+    venue_list = []
+    for venue in Venue.query.filter_by(city=city, state=state).all():
+      venue_list.append({
+        'id': venue.id,
+        'name': venue.name,
+        'num_upcoming_shows': Show.query.filter_by(venue_id=venue.id)
+          .filter(Show.start_time > datetime.now()).count(),
+      })
+    data.append({'city': city, 'state': state, 'venues': venue_list})
+  return data
+
+
+def main():
+  args = parse_args()
+  handle, path = tempfile.mkstemp(suffix='.db')
+  os.close(handle)
+  os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+  from sqlalchemy import event
+  import app as fyyur
+
+  statements = []
+  with fyyur.app.app_context():
+    fyyur.db.create_all()
+    seed(fyyur.db, fyyur.Venue, fyyur.Artist, fyyur.Show, args)
+    fyyur.refresh_show_counters()
+    event.listen(fyyur.db.engine, 'before_cursor_execute',
+                 lambda *args, **kwargs: statements.append(args[2]))
+
+    start = time.perf_counter()
+    legacy = legacy_areas(fyyur.db, fyyur.Venue, fyyur.Show)
+    legacy_seconds = time.perf_counter() - start
+    legacy_statements = len(statements)
+
+  # Swap the template renderer for one that hands back the view's context, so
+  # the listing can be compared with the legacy data structure.
+  render_template = fyyur.render_template
+  fyyur.render_template = lambda template, **context: context
+  try:
+    with fyyur.app.test_request_context('/venues'):
+      del statements[:]
+      start = time.perf_counter()
+      context = fyyur.venues()
+      seconds = time.perf_counter() - start
+  finally:
+    fyyur.render_template = render_template
+
+  # one statement for the conditional GET validators, one for the listing
+  assert len(statements) == 2, '/venues ran %d statements' % len(statements)
+
+  def normalise(areas):
+    return sorted((a['city'], a['state'], sorted((v['id'], v['num_upcoming_shows']) for v in a['venues']))
+                  for a in areas)
+  assert normalise(context['areas']) == normalise(legacy)
+
+  print('venues=%d shows=%d areas=%d' % (args.venues, args.shows, args.areas))
+  print('legacy   %6d statements  %8.3fs' % (legacy_statements, legacy_seconds))
+  print('/venues  %6d statements  %8.3fs' % (len(statements), seconds))
+  os.remove(path)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,127 @@
+#----------------------------------------------------------------------------#
+# Venue page view-models: retained memory and pickle size, dicts vs slots.
+#
+#   python benchmarks/view_models.py --pages 2000 --shows-per-page 20
+#
+# Builds the same venue pages twice from plain rows: as the dicts the page
+# view used to cache, and as the immutable viewmodels.VenueView/ShowSummary
+# objects it caches now. Reports the memory retained per cached page
+# (tracemalloc) and the pickled size, and checks that the slots objects
+# round-trip through pickle and refuse assignment.
+#----------------------------------------------------------------------------#
+import argparse
+import os
+import pickle
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import viewmodels
+
+GENRES = ['Blues', 'Classical', 'Folk', 'Jazz', 'Pop', 'Rock n Roll']
+
+
+def parse_args():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--pages', type=int, default=2000)
+  parser.add_argument('--shows-per-page', type=int, default=20)
+  parser.add_argument('--seed', type=int, default=1)
+  return parser.parse_args()
+
+
+def venue_rows(args):
+  # (venue row, genres, show rows) per page, as the page queries return them
+  rng = random.Random(args.seed)
+  now = datetime.now()
+  for i in range(1, args.pages + 1):
+    venue = (i, 'Venue %d' % i, 'City %d' % (i % 200), 'CA', '%d Main St' % i, '555-0100',
+             'https://img/v%d' % i, 'https://fb/v%d' % i, None, bool(i % 2), '', rng.randint(0, 20),
+             rng.randint(0, 20), now)
+    genres = tuple(sorted(rng.sample(GENRES, 2)))
+    shows = [(now + timedelta(days=rng.randint(-365, 365)), rng.randint(1, 5000), 'Artist %d' % j,
+              'https://img/a%d' % j, i * 1000 + j, now)
+             for j in range(args.shows_per_page)]
+    yield venue, genres, shows
+
+def dict_page(venue, genres, shows):
+  data = dict(zip(viewmodels.VenueView.COLUMNS, venue))
+  data['genres'] = list(genres)
+  data['past_shows'] = []
+  data['upcoming_shows'] = []
+  for start_time, artist_id, artist_name, artist_image_link, show_id, updated_at in shows:
+    show = {
+      'show_id': show_id,
+      'updated_at': updated_at,
+      'start_time': start_time,
+      'venue_id': data['id'],
+      'venue_name': data['name'],
+      'venue_image_link': data['image_link'],
+      'artist_id': artist_id,
+      'artist_name': artist_name,
+      'artist_image_link': artist_image_link,
+    }
+    data['upcoming_shows' if start_time > updated_at else 'past_shows'].append(show)
+  return data
+
+def slots_page(venue, genres, shows):
+  past_shows = []
+  upcoming_shows = []
+  for start_time, artist_id, artist_name, artist_image_link, show_id, updated_at in shows:
+    show = viewmodels.ShowSummary(
+      show_id=show_id,
+      updated_at=updated_at,
+      start_time=start_time,
+      venue_id=venue[0],
+      venue_name=venue[1],
+      venue_image_link=venue[6],
+      artist_id=artist_id,
+      artist_name=artist_name,
+      artist_image_link=artist_image_link,
+    )
+    (upcoming_shows if start_time > updated_at else past_shows).append(show)
+  return viewmodels.VenueView(*venue, genres=genres, upcoming_shows=tuple(upcoming_shows),
+                              past_shows=tuple(past_shows))
+
+
+def retained(build, rows):
+  # bytes still allocated after building and keeping every page
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  pages = [build(*row) for row in rows]
+  after = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return pages, after - before
+
+
+def main():
+  args = parse_args()
+  rows = list(venue_rows(args))
+
+  dict_pages, dict_bytes = retained(dict_page, rows)
+  slots_pages, slots_bytes = retained(slots_page, rows)
+
+  for page in slots_pages:
+    assert pickle.loads(pickle.dumps(page)) == page
+  try:
+    slots_pages[0].name = 'changed'
+  except AttributeError:
+    pass
+  else:
+    raise AssertionError('VenueView accepted an assignment')
+
+  dict_pickle = sum(len(pickle.dumps(page, pickle.HIGHEST_PROTOCOL)) for page in dict_pages)
+  slots_pickle = sum(len(pickle.dumps(page, pickle.HIGHEST_PROTOCOL)) for page in slots_pages)
+
+  print('pages=%d shows/page=%d' % (args.pages, args.shows_per_page))
+  print('dicts  retained %7.2f KiB/page  pickled %7.2f KiB/page' % (
+    dict_bytes / 1024 / args.pages, dict_pickle / 1024 / args.pages))
+  print('slots  retained %7.2f KiB/page  pickled %7.2f KiB/page' % (
+    slots_bytes / 1024 / args.pages, slots_pickle / 1024 / args.pages))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,121 @@
+#----------------------------------------------------------------------------#
+# Building blocks for bulk loading.
+#
+# Rows are streamed from CSV or JSON lines files in batches. Each batch gets
+# its primary keys up front (so association rows can be written alongside
+# it) and is written with PostgreSQL COPY, or executemany elsewhere. A
+# checkpoint file records how many input rows are committed, so an
+# interrupted import resumes after the last committed batch.
+#----------------------------------------------------------------------------#
+import csv
+import io
+import itertools
+import json
+import os
+
+from sqlalchemy import text
+
+
+def detect_format(path):
+  return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+def read_rows(stream, format):
+  # yields one dict per input row
+  if format == 'csv':
+    for row in csv.DictReader(stream):
+      yield row
+  else:
+    for line in stream:
+      if line.strip():
+        yield json.loads(line)
+
+def batches(rows, size, skip=0):
+  # yields (number of rows before the batch, batch), after skipping `skip`
+  rows = iter(rows)
+  for _ in itertools.islice(rows, skip):
+    pass
+  done = skip
+  while True:
+    batch = list(itertools.islice(rows, size))
+    if not batch:
+      return
+    yield done, batch
+    done += len(batch)
+
+
+class Checkpoint:
+  # a small JSON file next to the input, replaced atomically after each
+  # committed batch
+
+  def __init__(self, path, source, kind):
+    self.path = path
+    self.source = os.path.abspath(source)
+    self.kind = kind
+
+  def load(self):
+    # rows already committed by a previous run of the same import
+    if not os.path.exists(self.path):
+      return 0
+    with open(self.path) as f:
+      state = json.load(f)
+    if (state['source'], state['kind']) != (self.source, self.kind):
+      raise ValueError('{} belongs to an import of {} from {}'.format(self.path, state['kind'], state['source']))
+    return state['rows']
+
+  def save(self, rows, **counts):
+    state = dict(counts, source=self.source, kind=self.kind, rows=rows)
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump(state, f)
+    os.replace(self.path + '.tmp', self.path)
+
+  def clear(self):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+
+def allocate_ids(connection, table, count):
+  # reserves `count` primary keys for `table` inside the current transaction
+  if not count:
+    return []
+  if connection.dialect.name == 'postgresql':
+    return [row[0] for row in connection.execute(
+      text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+      table=table.name, count=count)]
+  # elsewhere ids continue from the current maximum; the insert fails on a
+  # concurrent writer rather than reusing its ids
+  start = connection.execute(text('SELECT coalesce(max(id), 0) FROM {}'.format(
+    connection.dialect.identifier_preparer.format_table(table)))).scalar()
+  return list(range(start + 1, start + 1 + count))
+
+def copy_value(value):
+  # a CSV field for COPY, which reads an unquoted empty field as NULL and a
+  # quoted one as ''
+  if value is None:
+    return ''
+  if isinstance(value, (bool, int, float)):
+    return str(value)
+  return '"' + str(value).replace('"', '""') + '"'
+
+def insert_rows(connection, table, rows):
+  # rows are dicts with the same keys
+  if not rows:
+    return
+  if connection.dialect.name != 'postgresql':
+    connection.execute(table.insert(), rows)
+    return
+
+  columns = list(rows[0])
+  buffer = io.StringIO()
+  for row in rows:
+    buffer.write(','.join(copy_value(row[column]) for column in columns))
+    buffer.write('\n')
+  buffer.seek(0)
+
+  preparer = connection.dialect.identifier_preparer
+  statement = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+    preparer.format_table(table), ', '.join(preparer.quote(column) for column in columns))
+  cursor = connection.connection.cursor()
+  try:
+    cursor.copy_expert(statement, buffer)
+  finally:
+    cursor.close()
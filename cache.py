@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Read-through cache for page view-models.
+#
+# A ReadThroughCache sits in front of a storage backend (an in-process LRU
+# with expiry by default; anything with get/set/delete/clear will do).
+# Concurrent misses on one key are collapsed into a single load, and with a
+# stale TTL an expired value keeps being served while one background load
+# refreshes it. Entries are never invalidated: callers put the page's
+# validators in the key, so a change moves the key and the old entry just
+# expires.
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+  # in-process backend: holds up to `max_entries` (value, expires_at) pairs
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None:
+        self._entries.move_to_end(key)
+      return entry
+
+  def set(self, key, value, expires_at):
+    with self._lock:
+      self._entries[key] = (value, expires_at)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def delete(self, key):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+class _Load:
+
+  def __init__(self):
+    self.done = threading.Event()
+    self.value = None
+    self.error = None
+
+
+class ReadThroughCache:
+
+  def __init__(self, backend=None, ttl=300, stale_ttl=0, context=None):
+    # `context` returns a context manager entered around background
+    # refreshes, e.g. app.app_context
+    self.backend = backend if backend is not None else LRUCache()
+    self.ttl = ttl
+    self.stale_ttl = stale_ttl
+    self.context = context
+    self._lock = threading.Lock()
+    self._loads = {}
+
+  def get(self, key, loader):
+    # returns the cached value for `key`, calling `loader()` on a miss;
+    # None results are passed through but not cached
+    entry = self.backend.get(key)
+    now = time.time()
+    if entry is not None:
+      value, expires_at = entry
+      if now < expires_at:
+        return value
+      if now < expires_at + self.stale_ttl:
+        self._refresh_in_background(key, loader)
+        return value
+    return self._load(key, loader)
+
+  def _load(self, key, loader):
+    with self._lock:
+      load = self._loads.get(key)
+      leader = load is None
+      if leader:
+        load = self._loads[key] = _Load()
+
+    if not leader:
+      load.done.wait()
+      if load.error is not None:
+        raise load.error
+      return load.value
+
+    try:
+      load.value = loader()
+      if load.value is not None:
+        self.backend.set(key, load.value, time.time() + self.ttl)
+      return load.value
+    except Exception as error:
+      load.error = error
+      raise
+    finally:
+      with self._lock:
+        del self._loads[key]
+      load.done.set()
+
+  def _refresh_in_background(self, key, loader):
+    with self._lock:
+      if key in self._loads:
+        return
+
+    def refresh():
+      try:
+        if self.context is None:
+          self._load(key, loader)
+        else:
+          with self.context():
+            self._load(key, loader)
+      except Exception:
+        # the stale value stays in place until the next miss retries
+        pass
+
+    threading.Thread(target=refresh, daemon=True).start()
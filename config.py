@@ -10,5 +10,112 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://shaker:a@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgres://shaker:a@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool. Sizes and timeouts apply to server databases (SQLite
+# gets SQLAlchemy's null/singleton pools); DATABASE_POOL_RECYCLE closes
+# connections older than that many seconds and DATABASE_POOL_PRE_PING tests
+# each connection on checkout. Set DATABASE_TRANSACTION_POOLING=1 when
+# connecting through a transaction-level pooler such as PgBouncer in
+# transaction mode: the app then keeps no connections of its own.
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+DATABASE_POOL_RECYCLE = int(os.environ['DATABASE_POOL_RECYCLE']) if os.environ.get('DATABASE_POOL_RECYCLE') else None
+DATABASE_POOL_PRE_PING = os.environ.get('DATABASE_POOL_PRE_PING', '') not in ('', '0')
+DATABASE_TRANSACTION_POOLING = os.environ.get('DATABASE_TRANSACTION_POOLING', '') not in ('', '0')
+
+# Read replicas, as a comma-separated list of database URLs. Queries made
+# while serving GET requests (and views marked with
+# database.replica_reads) go to one of them until the request writes;
+# DATABASE_REPLICA_SELECTION is 'round-robin' or 'least-connections'.
+DATABASE_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+DATABASE_REPLICA_SELECTION = os.environ.get('DATABASE_REPLICA_SELECTION', 'round-robin')
+
+# Per-request SQL statistics. The number of statements and the time spent in
+# them go into a Server-Timing header and the log; a request that runs one
+# parameterised statement more than SQL_REPEATED_STATEMENT_THRESHOLD times
+# (typically an N+1 query in a loop) is logged as a warning naming its view.
+# Set SQL_INSTRUMENTATION=0 to disable.
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '1') not in ('', '0')
+SQL_REPEATED_STATEMENT_THRESHOLD = int(os.environ.get('SQL_REPEATED_STATEMENT_THRESHOLD', 5))
+
+# Prometheus metrics at /metrics, when prometheus_client is installed. With
+# several worker processes, point PROMETHEUS_MULTIPROC_DIR at an empty
+# directory shared by them (see metrics.py).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') not in ('', '0')
+
+# Request profiling (see profiler.py); profiles are written to PROFILER_DIR.
+# A request is profiled when it sends an X-Profile header made by `flask
+# profile-header`, which is signed with PROFILER_SECRET (unset disables
+# it), or at random with probability PROFILER_SAMPLE_RATE, using
+# PROFILER_MODE ('sampling' or 'cprofile'). PROFILER_ENDPOINTS limits random
+# sampling to a comma-separated list of view names, e.g. show_venue.
+PROFILER_SECRET = os.environ.get('PROFILER_SECRET')
+PROFILER_DIR = os.environ.get('PROFILER_DIR', os.path.join(basedir, 'profiles'))
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0))
+PROFILER_MODE = os.environ.get('PROFILER_MODE', 'sampling')
+PROFILER_ENDPOINTS = [name for name in os.environ.get('PROFILER_ENDPOINTS', '').split(',') if name]
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.001))
+
+# Number of shows rendered per page of /shows, and the largest page size a
+# client may ask for with ?page_size=
+SHOWS_PAGE_SIZE = 30
+SHOWS_MAX_PAGE_SIZE = 200
+
+# Maximum number of venues or artists returned by a name search
+SEARCH_RESULT_LIMIT = 50
+
+# Typeahead suggestions: default and maximum number of names returned, and
+# how many normalised queries are memoised per index
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+TYPEAHEAD_CACHE_SIZE = 4096
+
+# JSON API (/api/v1): default and maximum number of items per page
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Faceted browsing: default and maximum number of ids per page
+BROWSE_PAGE_SIZE = 50
+BROWSE_MAX_PAGE_SIZE = 500
+
+# Seconds between checks of whether another worker (or `flask import`) has
+# changed venues or artists since this worker built its typeahead and facet
+# indexes; a change rebuilds them
+INDEX_REFRESH_INTERVAL = float(os.environ.get('INDEX_REFRESH_INTERVAL', 5))
+
+# Read-through cache of the venue and artist page view-models. Entries live
+# for VIEW_CACHE_TTL seconds; with VIEW_CACHE_STALE_TTL > 0 an expired entry
+# is served for that many more seconds while it is rebuilt in the
+# background. VIEW_CACHE_BACKEND may name a class (e.g. 'mycache.Backend')
+# with get/set/delete/clear to use instead of the in-process LRU.
+VIEW_CACHE_BACKEND = None
+VIEW_CACHE_MAX_ENTRIES = 10000
+VIEW_CACHE_TTL = 300
+VIEW_CACHE_STALE_TTL = 0
+
+# Rendered template fragments ({% cache %} blocks, e.g. show tiles). Set
+# FRAGMENT_CACHE_MAX_ENTRIES to 0 to disable, or FRAGMENT_CACHE_BACKEND to a
+# class with get/set/delete/clear to share fragments between workers.
+FRAGMENT_CACHE_BACKEND = None
+FRAGMENT_CACHE_MAX_ENTRIES = 50000
+FRAGMENT_CACHE_TTL = 3600
+
+# Number of formatted timestamps memoised by the datetime template filter
+# (0 disables the memo)
+DATETIME_FILTER_MEMO_SIZE = 4096
+
+# Compiled templates are kept as bytecode in TEMPLATE_BYTECODE_CACHE_DIR
+# (empty to disable) so new workers skip compiling them; `flask
+# compile-templates` fills it at build time. With TEMPLATE_WARMUP set, each
+# worker renders every page template once at boot.
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', os.path.join(basedir, '.jinja_cache'))
+TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', '') not in ('', '0')
+
+# Defer importing libraries only some routes need (date parsing and
+# formatting, forms, flask_moment) until first use, and only register
+# Flask-Migrate under the flask command. Set LAZY_IMPORTS=0 to import
+# everything at boot, e.g. before forking workers.
+LAZY_IMPORTS = os.environ.get('LAZY_IMPORTS', '1') not in ('', '0')
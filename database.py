@@ -0,0 +1,281 @@
+#----------------------------------------------------------------------------#
+# Engine configuration, connection pool and query statistics.
+#
+# engine_options() turns the DATABASE_* settings into create_engine()
+# arguments. The SQLAlchemy extension below wraps whichever pool class an
+# engine ends up with so checkouts, waits and connects are counted per
+# engine, times the statements run while serving a request, and its
+# sessions send reads to replicas where that is safe.
+#----------------------------------------------------------------------------#
+import collections
+import itertools
+import threading
+import time
+
+import flask_sqlalchemy
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event, exc, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def engine_options(config):
+  url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+  options = {}
+  if config['DATABASE_TRANSACTION_POOLING']:
+    # behind a transaction-level pooler (PgBouncer pool_mode=transaction)
+    # consecutive transactions may run on different server connections, so
+    # keep no connections of our own and no state beyond a transaction
+    options['poolclass'] = NullPool
+    return options
+
+  if config['DATABASE_POOL_RECYCLE'] is not None:
+    options['pool_recycle'] = config['DATABASE_POOL_RECYCLE']
+  options['pool_pre_ping'] = config['DATABASE_POOL_PRE_PING']
+  # SQLite gets a null or singleton pool, which take no size arguments
+  if url.get_backend_name() != 'sqlite':
+    options.update(
+      poolclass=QueuePool,
+      pool_size=config['DATABASE_POOL_SIZE'],
+      max_overflow=config['DATABASE_MAX_OVERFLOW'],
+      pool_timeout=config['DATABASE_POOL_TIMEOUT'],
+    )
+  return options
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+def replica_binds(config):
+  # SQLALCHEMY_BINDS entries for DATABASE_REPLICA_URLS
+  return {REPLICA_BIND_PREFIX + str(i): url for i, url in enumerate(config['DATABASE_REPLICA_URLS'])}
+
+
+class PoolStats:
+  # `on_change`, if set, is called after every update
+
+  def __init__(self, on_change=None):
+    self.on_change = on_change
+    self._lock = threading.Lock()
+    self.checkouts = 0
+    self.checkins = 0
+    self.connects = 0
+    self.invalidations = 0
+    self.timeouts = 0
+    self.waiting = 0
+    self.wait_seconds = 0.0
+    self.max_wait_seconds = 0.0
+
+  def add(self, **counts):
+    with self._lock:
+      for name, value in counts.items():
+        setattr(self, name, getattr(self, name) + value)
+    self._changed()
+
+  @property
+  def in_use(self):
+    return self.checkouts - self.checkins
+
+  def checked_out(self, seconds):
+    with self._lock:
+      self.checkouts += 1
+      self.waiting -= 1
+      self.wait_seconds += seconds
+      self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+    self._changed()
+
+  def _changed(self):
+    if self.on_change is not None:
+      self.on_change()
+
+  def snapshot(self, pool=None):
+    with self._lock:
+      stats = {
+        'checkouts': self.checkouts,
+        'checkins': self.checkins,
+        'connects': self.connects,
+        'invalidations': self.invalidations,
+        'timeouts': self.timeouts,
+        'waiting': self.waiting,
+        'wait_seconds': self.wait_seconds,
+        'max_wait_seconds': self.max_wait_seconds,
+        'in_use': self.checkouts - self.checkins,
+      }
+    if isinstance(pool, QueuePool):
+      stats.update(size=pool.size(), checked_in=pool.checkedin(),
+                   checked_out=pool.checkedout(), overflow=pool.overflow())
+    return stats
+
+
+class InstrumentedPool:
+  # mixed in before a pool class; `stats` is set per engine by instrument()
+
+  stats = None
+
+  def connect(self):
+    return self._timed_checkout(super(InstrumentedPool, self).connect)
+
+  def unique_connection(self):
+    # what Engine checks out with before SQLAlchemy 1.4
+    return self._timed_checkout(super(InstrumentedPool, self).unique_connection)
+
+  def _timed_checkout(self, checkout):
+    # time spent here is the checkout latency: waiting for a free
+    # connection, opening a new one and any pre-ping
+    self.stats.add(waiting=1)
+    started = time.perf_counter()
+    try:
+      connection = checkout()
+    except exc.TimeoutError:
+      self.stats.add(waiting=-1, timeouts=1)
+      raise
+    except Exception:
+      self.stats.add(waiting=-1)
+      raise
+    self.stats.checked_out(time.perf_counter() - started)
+    return connection
+
+def instrument(poolclass, stats):
+  return type('Instrumented' + poolclass.__name__, (InstrumentedPool, poolclass), {'stats': stats})
+
+
+class QueryStats:
+  # statements run in one app context (a request); each parameterised
+  # statement is counted separately, so one that runs once per row of an
+  # earlier result (an N+1 pattern) stands out
+
+  def __init__(self):
+    self.count = 0
+    self.seconds = 0.0
+    self.statements = collections.Counter()
+
+  def record(self, statement, seconds):
+    self.count += 1
+    self.seconds += seconds
+    self.statements[statement] += 1
+
+  def repeated(self, threshold):
+    # (statement, times run) for statements run more than `threshold` times
+    return [(statement, count) for statement, count in self.statements.most_common() if count > threshold]
+
+def current_query_stats():
+  # the QueryStats being collected for the current app context, if any
+  return g.get('query_stats') if has_app_context() else None
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+  context._query_started = time.perf_counter()
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+  stats = current_query_stats()
+  if stats is not None:
+    stats.record(statement, time.perf_counter() - context._query_started)
+
+
+def replica_reads(view):
+  # marks a view that only reads, so its queries may go to a replica even
+  # when it is not a GET (e.g. search forms that POST)
+  view.replica_reads = True
+  return view
+
+def reads_from_replica():
+  if not has_request_context():
+    return False
+  if request.method in ('GET', 'HEAD'):
+    return True
+  view = current_app.view_functions.get(request.endpoint)
+  return getattr(view, 'replica_reads', False)
+
+
+class RoutingSession(flask_sqlalchemy.SignallingSession):
+  # Inside read-only requests, statements go to a replica chosen once per
+  # session (so one request sees one replica). From the first flush on,
+  # everything goes to the primary, so a request reads its own writes.
+
+  def __init__(self, db, **options):
+    self._db = db
+    self._replica = None
+    self._wrote = False
+    super(RoutingSession, self).__init__(db, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    if not self._wrote and reads_from_replica():
+      if self._replica is None:
+        self._replica = self._db.choose_replica(self.app)
+      if self._replica is not None:
+        return self._replica
+    return super(RoutingSession, self).get_bind(mapper, clause)
+
+@event.listens_for(RoutingSession, 'before_flush')
+def stay_on_primary(session, flush_context, instances):
+  session._wrote = True
+
+
+def pool_name(bind):
+  # how a bind's pool is labelled in statistics: never by URL, which names
+  # the database user, host and database
+  return 'primary' if bind is None else bind
+
+class EngineConnector(flask_sqlalchemy._EngineConnector):
+  # passes the bind's pool name on to SQLAlchemy.create_engine()
+
+  def get_options(self, sa_url, echo):
+    sa_url, options = super(EngineConnector, self).get_options(sa_url, echo)
+    return sa_url, dict(options, pool_name=pool_name(self._bind))
+
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+
+  def __init__(self, *args, **kwargs):
+    # (pool name, pool class, engine, stats) for every engine created
+    self.pools = []
+    # called with (pool name, stats snapshot) whenever a pool's statistics
+    # change, in the process that owns the pool
+    self.pool_listeners = []
+    self._next_replica = itertools.count()
+    super(SQLAlchemy, self).__init__(*args, **kwargs)
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def choose_replica(self, app):
+    # the replica engine for a session by DATABASE_REPLICA_SELECTION, or
+    # None without replicas; 'least-connections' picks the replica with the
+    # fewest checked out connections, starting from the next one in turn
+    keys = sorted(key for key in app.config['SQLALCHEMY_BINDS'] or ()
+                  if key.startswith(REPLICA_BIND_PREFIX))
+    if not keys:
+      return None
+    start = next(self._next_replica) % len(keys)
+    engines = [self.get_engine(app, bind=key) for key in keys[start:] + keys[:start]]
+    if app.config['DATABASE_REPLICA_SELECTION'] == 'least-connections':
+      return min(engines, key=lambda engine: engine.pool.stats.in_use)
+    return engines[0]
+
+  def make_connector(self, app=None, bind=None):
+    return EngineConnector(self, self.get_app(app), bind)
+
+  def create_engine(self, sa_url, engine_opts):
+    engine_opts = dict(engine_opts)
+    name = engine_opts.pop('pool_name', pool_name(None))
+    poolclass = engine_opts.get('poolclass') or sa_url.get_dialect().get_pool_class(sa_url)
+    stats = PoolStats()
+    engine_opts['poolclass'] = instrument(poolclass, stats)
+    engine = super(SQLAlchemy, self).create_engine(sa_url, engine_opts)
+    stats.on_change = lambda: self._pool_changed(name, engine, stats)
+    # pool events registered on the engine carry over when the pool is
+    # recreated
+    event.listen(engine, 'connect', lambda *args: stats.add(connects=1))
+    event.listen(engine, 'checkin', lambda *args: stats.add(checkins=1))
+    event.listen(engine, 'invalidate', lambda *args: stats.add(invalidations=1))
+    event.listen(engine, 'before_cursor_execute', start_query_timer)
+    event.listen(engine, 'after_cursor_execute', record_query)
+    self.pools.append((name, poolclass.__name__, engine, stats))
+    return engine
+
+  def _pool_changed(self, name, engine, stats):
+    if self.pool_listeners:
+      snapshot = stats.snapshot(engine.pool)
+      for listener in self.pool_listeners:
+        listener(name, snapshot)
+
+  def pool_stats(self):
+    return {name: dict(stats.snapshot(engine.pool), pool=poolclass)
+            for name, poolclass, engine, stats in self.pools}
@@ -0,0 +1,79 @@
+#----------------------------------------------------------------------------#
+# Streaming serialisation for catalog exports.
+#
+# stream() turns an iterator of row tuples into an iterator of text (or
+# gzip) chunks of roughly CHUNK_SIZE bytes, suitable for a streamed response
+# body or for writing to a file, so memory stays flat whatever the row
+# count. CSV cells and JSON values use the same formats `flask import`
+# reads: booleans as true/false and timestamps as 'YYYY-MM-DD HH:MM:SS'.
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+CHUNK_SIZE = 64 * 1024
+# the format forms.ShowForm's DateTimeField, and so `flask import`, reads
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def timestamp(value):
+  return value.strftime(TIMESTAMP_FORMAT)
+
+def csv_cell(value):
+  if isinstance(value, datetime):
+    return timestamp(value)
+  if isinstance(value, bool):
+    return 'true' if value else 'false'
+  if isinstance(value, (list, tuple)):
+    return ','.join(value)
+  return value
+
+def csv_lines(columns, rows):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for row in rows:
+    writer.writerow([csv_cell(value) for value in row])
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+def json_value(value):
+  return timestamp(value) if isinstance(value, datetime) else str(value)
+
+def jsonl_lines(columns, rows):
+  for row in rows:
+    yield json.dumps(dict(zip(columns, row)), default=json_value) + '\n'
+
+FORMATS = {
+  'csv': ('text/csv', csv_lines),
+  'jsonl': ('application/x-ndjson', jsonl_lines),
+}
+
+def chunked(lines, size=CHUNK_SIZE):
+  chunk = []
+  length = 0
+  for line in lines:
+    chunk.append(line)
+    length += len(line)
+    if length >= size:
+      yield ''.join(chunk)
+      chunk = []
+      length = 0
+  if chunk:
+    yield ''.join(chunk)
+
+def gzipped(chunks):
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  for chunk in chunks:
+    data = compressor.compress(chunk.encode('utf-8'))
+    if data:
+      yield data
+  yield compressor.flush()
+
+def stream(columns, rows, format, compress=False):
+  # text chunks, or gzip member bytes when `compress` is set
+  chunks = chunked(FORMATS[format][1](columns, rows))
+  return gzipped(chunks) if compress else chunks
@@ -0,0 +1,122 @@
+#----------------------------------------------------------------------------#
+# In-memory facet index.
+#
+# For every facet value the index keeps a bitmap of the entity ids that have
+# it, stored as a Python int (bit n set <=> id n has the value). Selections
+# are ANDs of ORs over those bitmaps and counts are popcounts, so browsing
+# never needs a COUNT query.
+#----------------------------------------------------------------------------#
+import threading
+
+
+if hasattr(int, 'bit_count'):
+  popcount = int.bit_count
+else:
+  def popcount(bitmap):
+    return bin(bitmap).count('1')
+
+def iter_ids(bitmap, after=None):
+  # yields the ids set in `bitmap` in ascending order, starting past `after`
+  # (a non-negative id); the bits up to `after` are shifted out rather than
+  # masked, so a large cursor costs nothing
+  offset = 0
+  if after is not None:
+    offset = after + 1
+    bitmap >>= offset
+  while bitmap:
+    lowest = bitmap & -bitmap
+    yield offset + lowest.bit_length() - 1
+    bitmap ^= lowest
+
+
+class FacetIndex:
+
+  def __init__(self, facets):
+    self.facets = tuple(facets)
+    self._lock = threading.RLock()
+    self._clear()
+
+  def _clear(self):
+    self._all = 0
+    self._values = {}
+    self._bitmaps = {facet: {} for facet in self.facets}
+
+  def rebuild(self, entities):
+    # replaces the index with (id, {facet: values}) pairs
+    with self._lock:
+      self._clear()
+      for entity_id, values in entities:
+        self._add(entity_id, values)
+
+  def update(self, entity_id, values):
+    with self._lock:
+      self._discard(entity_id)
+      self._add(entity_id, values)
+
+  def remove(self, entity_id):
+    with self._lock:
+      self._discard(entity_id)
+
+  def _add(self, entity_id, values):
+    bit = 1 << entity_id
+    stored = {}
+    for facet in self.facets:
+      stored[facet] = frozenset(value for value in values.get(facet, ()) if value is not None)
+      bitmaps = self._bitmaps[facet]
+      for value in stored[facet]:
+        bitmaps[value] = bitmaps.get(value, 0) | bit
+    self._values[entity_id] = stored
+    self._all |= bit
+
+  def _discard(self, entity_id):
+    stored = self._values.pop(entity_id, None)
+    if stored is None:
+      return
+    bit = 1 << entity_id
+    for facet, values in stored.items():
+      bitmaps = self._bitmaps[facet]
+      for value in values:
+        bitmaps[value] &= ~bit
+        if not bitmaps[value]:
+          del bitmaps[value]
+    self._all &= ~bit
+
+  def _match(self, facet, values):
+    bitmaps = self._bitmaps[facet]
+    bitmap = 0
+    for value in values:
+      bitmap |= bitmaps.get(value, 0)
+    return bitmap
+
+  def select(self, filters, exclude=None):
+    # bitmap of the entities matching every facet in `filters` (any of the
+    # given values within a facet), ignoring the facet named by `exclude`
+    bitmap = self._all
+    for facet, values in filters.items():
+      if facet != exclude and values:
+        bitmap &= self._match(facet, values)
+    return bitmap
+
+  def browse(self, filters, after=None, limit=50):
+    # returns (total, ids, counts) for a selection; the counts of each facet
+    # are computed against the other facets' filters so every value shows
+    # how many results picking it would give
+    with self._lock:
+      selection = self.select(filters)
+      ids = []
+      # a cursor at or past the highest indexed id is an empty page
+      if after is None or after < self._all.bit_length() - 1:
+        for entity_id in iter_ids(selection, after):
+          if len(ids) == limit:
+            break
+          ids.append(entity_id)
+
+      counts = {}
+      for facet in self.facets:
+        base = self.select(filters, exclude=facet)
+        counts[facet] = {}
+        for value, bitmap in sorted(self._bitmaps[facet].items()):
+          count = popcount(bitmap & base)
+          if count:
+            counts[facet][value] = count
+      return popcount(selection), ids, counts
@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------#
+# Jinja fragment caching.
+#
+#   {% cache 'show-tile', show.show_id, show.updated_at %} ... {% endcache %}
+#
+# The rendered body is stored under a key built from the tag's arguments in
+# the backend set as `environment.fragment_cache` (anything with the
+# get/set interface of cache.LRUCache). Without a backend the body is simply
+# rendered.
+#----------------------------------------------------------------------------#
+import time
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class FragmentCacheExtension(Extension):
+
+  tags = {'cache'}
+
+  def __init__(self, environment):
+    super(FragmentCacheExtension, self).__init__(environment)
+    environment.extend(fragment_cache=None, fragment_cache_ttl=3600)
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    parts = [parser.parse_expression()]
+    while parser.stream.skip_if('comma'):
+      parts.append(parser.parse_expression())
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    call = self.call_method('_render', [nodes.List(parts)])
+    return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+  def _render(self, parts, caller):
+    backend = self.environment.fragment_cache
+    if backend is None:
+      return caller()
+
+    key = 'fragment:' + ':'.join(str(part) for part in parts)
+    entry = backend.get(key)
+    if entry is not None and time.time() < entry[1]:
+      return Markup(entry[0])
+
+    fragment = caller()
+    backend.set(key, fragment, time.time() + self.environment.fragment_cache_ttl)
+    return fragment
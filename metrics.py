@@ -0,0 +1,101 @@
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#
+# Needs prometheus_client; without it `available` is False and the app
+# serves no /metrics. Under several worker processes set
+# PROMETHEUS_MULTIPROC_DIR to an empty directory shared by the workers
+# before they start: every process then writes its samples there and
+# /metrics aggregates all of them, whichever worker answers. Call
+# mark_process_dead(pid) when a worker exits (e.g. from gunicorn's
+# child_exit hook) so its pool gauges are dropped.
+#----------------------------------------------------------------------------#
+import os
+import time
+
+from jinja2 import Template
+
+try:
+  import prometheus_client
+  from prometheus_client import multiprocess
+except ImportError:
+  prometheus_client = None
+
+available = prometheus_client is not None
+
+# request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# pool gauges and the database.PoolStats.snapshot() values they report;
+# checked_out counts from the pool events, which every pool class has
+POOL_GAUGES = {'checked_out': 'in_use', 'overflow': 'overflow', 'waiting': 'waiting'}
+
+
+def multiprocess_dir():
+  return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+def mark_process_dead(pid):
+  if available and multiprocess_dir():
+    multiprocess.mark_process_dead(pid)
+
+
+class Metrics:
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    self.requests = prometheus_client.Counter(
+      'fyyur_requests_total', 'Requests handled.', ['endpoint', 'method', 'status'])
+    self.latency = prometheus_client.Histogram(
+      'fyyur_request_duration_seconds', 'Time to build a response, excluding streamed bodies.',
+      ['endpoint'], buckets=buckets)
+    self.templates = prometheus_client.Histogram(
+      'fyyur_template_render_seconds', 'Time to render a page template.', ['template'], buckets=buckets)
+    self.statements = prometheus_client.Counter(
+      'fyyur_sql_statements_total', 'SQL statements run while serving requests.', ['endpoint'])
+    self.statement_seconds = prometheus_client.Counter(
+      'fyyur_sql_statement_seconds_total', 'Time spent in SQL statements while serving requests.', ['endpoint'])
+    # one series per live process and engine; summed across live processes
+    self.pool = {
+      name: prometheus_client.Gauge(
+        'fyyur_db_pool_' + name, 'Connection pool {} connections.'.format(name.replace('_', ' ')),
+        ['pool'], multiprocess_mode='livesum')
+      for name in POOL_GAUGES
+    }
+
+  def observe_request(self, endpoint, method, status, seconds, query_stats=None):
+    endpoint = endpoint or 'none'
+    self.requests.labels(endpoint, method, str(status)).inc()
+    self.latency.labels(endpoint).observe(seconds)
+    if query_stats is not None:
+      self.statements.labels(endpoint).inc(query_stats.count)
+      self.statement_seconds.labels(endpoint).inc(query_stats.seconds)
+
+  def observe_pool(self, name, stats):
+    # a database.SQLAlchemy pool listener: every process sets its own series
+    # as its pools change, so the livesum over processes is current
+    for gauge_name, key in POOL_GAUGES.items():
+      if key in stats:
+        self.pool[gauge_name].labels(name).set(stats[key])
+
+  def timed_template_class(self):
+    # a jinja2 Template class that records how long each top-level render
+    # takes; included and extended templates count towards their page
+    histogram = self.templates
+
+    class TimedTemplate(Template):
+
+      def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+          return super(TimedTemplate, self).render(*args, **kwargs)
+        finally:
+          histogram.labels(self.name or 'string').observe(time.perf_counter() - started)
+
+    return TimedTemplate
+
+  def exposition(self):
+    # (body, content type) with the samples of every process
+    if multiprocess_dir():
+      registry = prometheus_client.CollectorRegistry()
+      multiprocess.MultiProcessCollector(registry)
+    else:
+      registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
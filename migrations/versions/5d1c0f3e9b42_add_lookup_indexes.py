@@ -0,0 +1,51 @@
+"""add indexes for the show, venue and genre lookup paths
+
+Revision ID: 5d1c0f3e9b42
+Revises: a30c2261ad75
+Create Date: 2026-10-18 17:20:11.402356
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1c0f3e9b42'
+down_revision = 'a30c2261ad75'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time']),
+    ('ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time']),
+    ('ix_show_start_time_id', 'show', ['start_time', 'id']),
+    ('ix_venue_city_state', 'venue', ['city', 'state']),
+    ('ix_genre_artist_id', 'genre', ['artist_id']),
+    ('ix_genre_venue_id', 'genre', ['venue_id']),
+]
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade():
+    # On PostgreSQL the indexes are built CONCURRENTLY so the migration can be
+    # applied to a live database; that has to happen outside a transaction.
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    if _is_postgresql():
+        with op.get_context().autocommit_block():
+            for name, table, columns in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,46 @@
+"""add trigram / FTS5 name search indexes for venues and artists
+
+Revision ID: 8f2b6a7d4c10
+Revises: 5d1c0f3e9b42
+Create Date: 2026-10-18 17:52:40.118029
+
+"""
+from alembic import op
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2b6a7d4c10'
+down_revision = '5d1c0f3e9b42'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['venue', 'artist']
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                for statement in search.postgresql_ddl(table, concurrently=True):
+                    op.execute(statement)
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for statement in search.sqlite_ddl(table):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            for table in TABLES:
+                for statement in search.postgresql_drop_ddl(table, concurrently=True):
+                    op.execute(statement)
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for statement in search.sqlite_drop_ddl(table):
+                op.execute(statement)
@@ -0,0 +1,111 @@
+"""normalise genres into a dictionary table with artist/venue associations
+
+Revision ID: c47e91a2d3b8
+Revises: 8f2b6a7d4c10
+Create Date: 2026-10-18 18:31:05.664210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47e91a2d3b8'
+down_revision = '8f2b6a7d4c10'
+branch_labels = None
+depends_on = None
+
+
+def _rename_postgresql_identity(old, new):
+    # PostgreSQL keeps the primary key index and id sequence names when a
+    # table is renamed; move them too so the replacement table can reuse them.
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER INDEX {0}_pkey RENAME TO {1}_pkey'.format(old, new))
+        op.execute('ALTER SEQUENCE {0}_id_seq RENAME TO {1}_id_seq'.format(old, new))
+
+
+def upgrade():
+    # The old table held one row per (genre name, entity). Keep it aside while
+    # the dictionary and association rows are derived from it; rows that
+    # belong to neither an artist nor a venue are orphans and are dropped.
+    op.drop_index('ix_genre_venue_id', table_name='genre')
+    op.drop_index('ix_genre_artist_id', table_name='genre')
+    op.rename_table('genre', 'genre_legacy')
+    _rename_postgresql_identity('genre', 'genre_legacy')
+
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_genre_name', 'genre', ['name'], unique=True)
+    op.create_table('artist_genre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genre_genre_id', 'artist_genre', ['genre_id'], unique=False)
+    op.create_table('venue_genre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genre_genre_id', 'venue_genre', ['genre_id'], unique=False)
+
+    op.execute(
+        'INSERT INTO genre (name) '
+        'SELECT DISTINCT name FROM genre_legacy '
+        'WHERE name IS NOT NULL AND (artist_id IS NOT NULL OR venue_id IS NOT NULL)'
+    )
+    op.execute(
+        'INSERT INTO artist_genre (artist_id, genre_id) '
+        'SELECT DISTINCT genre_legacy.artist_id, genre.id '
+        'FROM genre_legacy JOIN genre ON genre.name = genre_legacy.name '
+        'WHERE genre_legacy.artist_id IS NOT NULL'
+    )
+    op.execute(
+        'INSERT INTO venue_genre (venue_id, genre_id) '
+        'SELECT DISTINCT genre_legacy.venue_id, genre.id '
+        'FROM genre_legacy JOIN genre ON genre.name = genre_legacy.name '
+        'WHERE genre_legacy.venue_id IS NOT NULL'
+    )
+
+    op.drop_table('genre_legacy')
+
+
+def downgrade():
+    op.create_table('genre_legacy',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=True),
+    sa.Column('artist_id', sa.Integer(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        'INSERT INTO genre_legacy (name, artist_id) '
+        'SELECT genre.name, artist_genre.artist_id '
+        'FROM artist_genre JOIN genre ON genre.id = artist_genre.genre_id'
+    )
+    op.execute(
+        'INSERT INTO genre_legacy (name, venue_id) '
+        'SELECT genre.name, venue_genre.venue_id '
+        'FROM venue_genre JOIN genre ON genre.id = venue_genre.genre_id'
+    )
+
+    op.drop_index('ix_venue_genre_genre_id', table_name='venue_genre')
+    op.drop_table('venue_genre')
+    op.drop_index('ix_artist_genre_genre_id', table_name='artist_genre')
+    op.drop_table('artist_genre')
+    op.drop_index('ix_genre_name', table_name='genre')
+    op.drop_table('genre')
+
+    op.rename_table('genre_legacy', 'genre')
+    _rename_postgresql_identity('genre_legacy', 'genre')
+    op.create_index('ix_genre_artist_id', 'genre', ['artist_id'], unique=False)
+    op.create_index('ix_genre_venue_id', 'genre', ['venue_id'], unique=False)
@@ -0,0 +1,45 @@
+"""add materialised upcoming/past show counters to venues and artists
+
+Revision ID: e5a80c6f1d27
+Revises: c47e91a2d3b8
+Create Date: 2026-10-18 19:04:47.291553
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a80c6f1d27'
+down_revision = 'c47e91a2d3b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The application compares start times with its own local clock. Pass it
+    # as an ISO string so offline (--sql) migrations can render it too.
+    now = datetime.now().isoformat(' ')
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+        op.execute(sa.text(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM show '
+            'WHERE show.{table}_id = {table}.id AND show.start_time > :now), '
+            'past_shows_count = (SELECT count(*) FROM show '
+            'WHERE show.{table}_id = {table}.id AND show.start_time <= :now)'.format(table=table)
+        ).bindparams(now=now))
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
+        search.restore_sqlite_triggers(op, table)
@@ -0,0 +1,42 @@
+"""add updated_at to venues, artists and shows
+
+Revision ID: f1b3d9e06a54
+Revises: e5a80c6f1d27
+Create Date: 2026-10-18 19:46:12.870342
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b3d9e06a54'
+down_revision = 'e5a80c6f1d27'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['venue', 'artist', 'show']
+
+
+def upgrade():
+    # existing rows count as modified now; passed as an ISO string so
+    # offline (--sql) migrations can render it
+    now = datetime.utcnow().isoformat(' ')
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(sa.text('UPDATE {} SET updated_at = :now'.format(table)).bindparams(now=now))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
+        if table in ('venue', 'artist'):
+            search.restore_sqlite_triggers(op, table)
@@ -0,0 +1,110 @@
+#----------------------------------------------------------------------------#
+# Per-request profiling.
+#
+# A request is profiled either with cProfile (deterministic, writes a
+# .pstats file for pstats/snakeviz) or with a sampling profiler: a thread
+# that records the request thread's stack every few milliseconds and writes
+# the counts as collapsed stacks (.collapsed, one `frame;frame;... count`
+# line per stack) for flamegraph.pl or speedscope. Which requests are
+# profiled is decided by the app: a header signed with sign() or random
+# sampling.
+#----------------------------------------------------------------------------#
+import collections
+import cProfile
+import hashlib
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+
+MODES = ('sampling', 'cprofile')
+
+
+def sign(secret, mode, expires):
+  # header value authorising profiling in `mode` until `expires` (a unix
+  # timestamp): 'mode:expires:signature'
+  message = '{}:{}'.format(mode, int(expires)).encode()
+  return '{}:{}'.format(message.decode(), hmac.new(secret.encode(), message, hashlib.sha256).hexdigest())
+
+def verify(secret, value, now=None):
+  # the mode a header value authorises, or None if it is malformed, forged
+  # or expired
+  try:
+    mode, expires, signature = value.split(':')
+    expires = int(expires)
+  except ValueError:
+    return None
+  if mode not in MODES or expires < (now if now is not None else time.time()):
+    return None
+  if not hmac.compare_digest(sign(secret, mode, expires), value):
+    return None
+  return mode
+
+def output_name(endpoint, request_id, started=None):
+  # '<UTC time>-<endpoint>-<request id>', safe as a file name
+  stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(started if started is not None else time.time()))
+  return re.sub(r'[^A-Za-z0-9_.-]', '_', '{}-{}-{}'.format(stamp, endpoint or 'none', request_id))
+
+
+def frame_label(code):
+  return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+class SamplingProfiler:
+  # samples the stack of the thread that calls start() until stop()
+
+  def __init__(self, interval=0.001):
+    self.interval = interval
+    self.stacks = collections.Counter()
+    self._thread_id = None
+    self._stopped = threading.Event()
+    self._sampler = None
+
+  def start(self):
+    self._thread_id = threading.get_ident()
+    self._sampler = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+    self._sampler.start()
+
+  def stop(self):
+    self._stopped.set()
+    self._sampler.join()
+
+  def _run(self):
+    while not self._stopped.wait(self.interval):
+      frame = sys._current_frames().get(self._thread_id)
+      labels = []
+      while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+      if labels:
+        self.stacks[';'.join(reversed(labels))] += 1
+
+  def write(self, path):
+    path += '.collapsed'
+    with open(path, 'w') as f:
+      for stack, count in self.stacks.most_common():
+        f.write('{} {}\n'.format(stack, count))
+    return path
+
+class DeterministicProfiler:
+  # cProfile over the calling thread
+
+  def __init__(self):
+    self.profile = cProfile.Profile()
+
+  def start(self):
+    self.profile.enable()
+
+  def stop(self):
+    self.profile.disable()
+
+  def write(self, path):
+    path += '.pstats'
+    self.profile.dump_stats(path)
+    return path
+
+def create(mode, interval=0.001):
+  if mode == 'cprofile':
+    return DeterministicProfiler()
+  return SamplingProfiler(interval)
@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Indexed name search.
+#
+# PostgreSQL: a pg_trgm GIN index on <table>.name serves ILIKE '%term%' and
+# results are ranked with similarity().
+# SQLite: an external-content FTS5 table <table>_search using the trigram
+# tokenizer, kept in sync with triggers and ranked with bm25.
+# Terms shorter than a trigram, and other databases, fall back to LIKE.
+#----------------------------------------------------------------------------#
+from sqlalchemy import DDL, event, func, text
+
+MIN_INDEXED_TERM_LENGTH = 3
+
+
+def fts_table(table_name):
+  return '{}_search'.format(table_name)
+
+def trigram_index(table_name):
+  return 'ix_{}_name_trgm'.format(table_name)
+
+def is_search_object(name):
+  # True for the database objects created here, which are not part of the
+  # model metadata and must be ignored by autogenerate.
+  return name.endswith('_name_trgm') or any(
+    name.startswith(fts_table(table_name)) for table_name in ('venue', 'artist'))
+
+
+def sqlite_ddl(table_name):
+  statements = [
+    "CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER {fts}_au AFTER UPDATE OF name ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+  ]
+  return [statement.format(fts=fts_table(table_name), table=table_name) for statement in statements]
+
+def sqlite_drop_ddl(table_name):
+  fts = fts_table(table_name)
+  return [
+    'DROP TRIGGER IF EXISTS {}_au'.format(fts),
+    'DROP TRIGGER IF EXISTS {}_ad'.format(fts),
+    'DROP TRIGGER IF EXISTS {}_ai'.format(fts),
+    'DROP TABLE IF EXISTS {}'.format(fts),
+  ]
+
+def restore_sqlite_triggers(op, table_name):
+  # for migrations: SQLite batch operations rebuild the table, which drops
+  # the triggers that keep <table>_search in sync; recreate them and the index
+  if op.get_bind().dialect.name == 'sqlite':
+    for statement in sqlite_drop_ddl(table_name) + sqlite_ddl(table_name):
+      op.execute(statement)
+
+def postgresql_ddl(table_name, concurrently=False):
+  create_index = 'CREATE INDEX CONCURRENTLY' if concurrently else 'CREATE INDEX'
+  return [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    '{} IF NOT EXISTS {} ON {} USING gin (name gin_trgm_ops)'.format(
+      create_index, trigram_index(table_name), table_name),
+  ]
+
+def postgresql_drop_ddl(table_name, concurrently=False):
+  drop_index = 'DROP INDEX CONCURRENTLY' if concurrently else 'DROP INDEX'
+  return ['{} IF EXISTS {}'.format(drop_index, trigram_index(table_name))]
+
+
+def install(table):
+  # create the search structures whenever create_all() creates the table
+  for statement in sqlite_ddl(table.name):
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+  for statement in sqlite_drop_ddl(table.name):
+    event.listen(table, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+  for statement in postgresql_ddl(table.name):
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def _escape_like(term):
+  return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_names(session, model, term, limit):
+  # returns up to `limit` (id, name) rows of `model` whose name contains
+  # `term`, case-insensitively, best matches first
+  term = (term or '').strip()
+  table = model.__table__
+  dialect = session.get_bind(model.__mapper__).dialect.name
+  pattern = '%{}%'.format(_escape_like(term))
+
+  if len(term) >= MIN_INDEXED_TERM_LENGTH and dialect == 'postgresql':
+    return session.query(model.id, model.name) \
+      .filter(model.name.ilike(pattern, escape='\\')) \
+      .order_by(func.similarity(model.name, term).desc(), model.id) \
+      .limit(limit) \
+      .all()
+
+  if len(term) >= MIN_INDEXED_TERM_LENGTH and dialect == 'sqlite':
+    fts = fts_table(table.name)
+    statement = text(
+      'SELECT {table}.id, {table}.name FROM {fts} JOIN {table} ON {table}.id = {fts}.rowid '
+      'WHERE {fts} MATCH :query ORDER BY {fts}.rank, {table}.id LIMIT :limit'.format(table=table.name, fts=fts))
+    query = '"{}"'.format(term.replace('"', '""'))
+    return session.execute(statement, {'query': query, 'limit': limit}, mapper=model.__mapper__).fetchall()
+
+  return session.query(model.id, model.name) \
+    .filter(func.lower(model.name).like(func.lower(pattern), escape='\\')) \
+    .order_by(model.name, model.id) \
+    .limit(limit) \
+    .all()
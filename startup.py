@@ -0,0 +1,112 @@
+#----------------------------------------------------------------------------#
+# Deferred imports and startup profiling.
+#
+# lazy_import() returns a placeholder that imports the module on first
+# attribute access, so libraries needed by a handful of routes stay off the
+# cold start path. profile_startup() imports an app in a fresh interpreter under
+# `python -X importtime`, serves one request and reports where the time went.
+#----------------------------------------------------------------------------#
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+
+
+class LazyModule:
+  # stands in for a module until one of its attributes is first read. The
+  # import then runs once, under a lock: importlib.util.LazyLoader swaps the
+  # module in without one before Python 3.12, so two threads of a threaded
+  # server could both trigger the load and one would see it half executed.
+
+  def __init__(self, name):
+    self._name = name
+    self._module = None
+    self._lock = threading.Lock()
+
+  def _load(self):
+    module = self._module
+    if module is None:
+      with self._lock:
+        if self._module is None:
+          self._module = importlib.import_module(self._name)
+        module = self._module
+    return module
+
+  def __getattr__(self, attr):
+    # only called for attributes the placeholder itself lacks
+    return getattr(self._load(), attr)
+
+  def __repr__(self):
+    return '<lazy module {!r}{}>'.format(self._name, '' if self._module is None else ' (loaded)')
+
+def lazy_import(name):
+  if name in sys.modules:
+    return sys.modules[name]
+  return LazyModule(name)
+
+def load(*modules):
+  # forces lazily imported modules to run now
+  for module in modules:
+    if isinstance(module, LazyModule):
+      module._load()
+
+
+# run in the child interpreter: argv is the module, app attribute and path
+FIRST_REQUEST = '''
+import json, sys, time
+started = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+response = getattr(module, sys.argv[2]).test_client().get(sys.argv[3])
+served = time.perf_counter()
+print(json.dumps({
+  'status': response.status_code,
+  'import_ms': (imported - started) * 1000,
+  'first_request_ms': (served - imported) * 1000,
+  'modules_loaded': len(sys.modules),
+}))
+'''
+
+def parse_importtime(stderr, module):
+  # (name, self_us, cumulative_us) for `module` and each import it made
+  # directly, from `python -X importtime` output
+  entries = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+    entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+
+  for i, (depth, name, self_us, cumulative_us) in enumerate(entries):
+    if name == module and depth == 0:
+      break
+  else:
+    return []
+
+  # children are printed before their parent and the previous top-level
+  # import marks where this module's imports begin
+  start = i
+  while start > 0 and entries[start - 1][0] > 0:
+    start -= 1
+  children = [(n, s, c) for d, n, s, c in entries[start:i] if d == 1]
+  return [(module, self_us, cumulative_us)] + children
+
+def profile_startup(module, attribute='app', path='/', env=None):
+  child_env = dict(os.environ, **(env or {}))
+  # the flask command sets this, and it changes what the app registers
+  child_env.pop('FLASK_RUN_FROM_CLI', None)
+  process = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', FIRST_REQUEST, module, attribute, path],
+    env=child_env, capture_output=True, text=True)
+  if process.returncode != 0:
+    raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'startup failed')
+
+  report = json.loads(process.stdout.strip().splitlines()[-1])
+  report['imports'] = [
+    {'module': name, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+    for name, self_us, cumulative_us in parse_importtime(process.stderr, module)
+  ]
+  return report
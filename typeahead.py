@@ -0,0 +1,104 @@
+#----------------------------------------------------------------------------#
+# In-process prefix index for typeahead search.
+#
+# Every name is indexed under each of its word suffixes ("the musical hop",
+# "musical hop", "hop"), kept in one sorted list, so a prefix lookup is a
+# bisect followed by a short scan. Normalised queries are memoised in a
+# small LRU that is cleared whenever the index changes.
+#----------------------------------------------------------------------------#
+import bisect
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalise(text):
+  # lower-cased words without accents or punctuation, so '(Le) Poisson'
+  # and 'Jay-Z' are found by 'le' and 'z'; names and queries share it
+  text = unicodedata.normalize('NFKD', text or '')
+  text = ''.join(c for c in text if not unicodedata.combining(c))
+  return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+class PrefixIndex:
+
+  # how many index entries a lookup may scan before it stops collecting
+  # candidates, which bounds the cost of one-letter queries
+  scan_factor = 20
+
+  def __init__(self, cache_size=1024):
+    self.cache_size = cache_size
+    self._lock = threading.RLock()
+    self._keys = []
+    self._names = {}
+    self._cache = OrderedDict()
+
+  def __len__(self):
+    return len(self._names)
+
+  def _keys_for(self, key, normalised):
+    words = normalised.split(' ')
+    return [(' '.join(words[i:]), key) for i in range(len(words)) if words[i]]
+
+  def rebuild(self, rows):
+    # replaces the whole index with (key, name) rows
+    names = {key: (name, normalise(name)) for key, name in rows}
+    keys = sorted(entry for key, (name, normalised) in names.items()
+                  for entry in self._keys_for(key, normalised))
+    with self._lock:
+      self._names = names
+      self._keys = keys
+      self._cache.clear()
+
+  def add(self, key, name):
+    with self._lock:
+      self._discard(key)
+      normalised = normalise(name)
+      self._names[key] = (name, normalised)
+      for entry in self._keys_for(key, normalised):
+        bisect.insort(self._keys, entry)
+      self._cache.clear()
+
+  def remove(self, key):
+    with self._lock:
+      self._discard(key)
+      self._cache.clear()
+
+  def _discard(self, key):
+    if key not in self._names:
+      return
+    name, normalised = self._names.pop(key)
+    for entry in self._keys_for(key, normalised):
+      i = bisect.bisect_left(self._keys, entry)
+      if i < len(self._keys) and self._keys[i] == entry:
+        del self._keys[i]
+
+  def lookup(self, query, limit=10):
+    # returns up to `limit` (key, name) pairs whose name has a word starting
+    # with `query`; names that start with it come first, then shorter names
+    query = normalise(query)
+    if not query:
+      return []
+
+    with self._lock:
+      cached = self._cache.get((query, limit))
+      if cached is not None:
+        self._cache.move_to_end((query, limit))
+        return cached
+
+      matches = {}
+      i = bisect.bisect_left(self._keys, (query,))
+      end = min(len(self._keys), i + limit * self.scan_factor)
+      while i < end and self._keys[i][0].startswith(query):
+        suffix, key = self._keys[i]
+        name, normalised = self._names[key]
+        matches[key] = (not normalised.startswith(query), len(name), name)
+        i += 1
+
+      result = [(key, self._names[key][0]) for key in sorted(matches, key=matches.get)[:limit]]
+
+      self._cache[(query, limit)] = result
+      if len(self._cache) > self.cache_size:
+        self._cache.popitem(last=False)
+      return result
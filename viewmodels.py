@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------#
+# Page view-models.
+#
+# Plain, immutable value objects built from query rows. They hold no
+# reference to ORM state, so they can be cached, shared between requests and
+# pickled for an out-of-process cache; __slots__ keeps them smaller than the
+# equivalent dicts.
+#----------------------------------------------------------------------------#
+
+
+class ViewModel:
+
+  __slots__ = ()
+
+  def __init__(self, *args, **kwargs):
+    # values by position in __slots__ order, or by name
+    if len(args) > len(self.__slots__):
+      raise TypeError('{} takes {} values'.format(type(self).__name__, len(self.__slots__)))
+    values = dict(zip(self.__slots__, args))
+    values.update(kwargs)
+    missing = [name for name in self.__slots__ if name not in values]
+    unknown = [name for name in values if name not in self.__slots__]
+    if missing or unknown:
+      raise TypeError('{}: missing {}, unknown {}'.format(type(self).__name__, missing, unknown))
+    for name in self.__slots__:
+      object.__setattr__(self, name, values[name])
+
+  def __setattr__(self, name, value):
+    raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+  def __delattr__(self, name):
+    raise AttributeError('{} is immutable'.format(type(self).__name__))
+
+  def _values(self):
+    return tuple(getattr(self, name) for name in self.__slots__)
+
+  def __reduce__(self):
+    return type(self), self._values()
+
+  def __eq__(self, other):
+    return type(self) is type(other) and self._values() == other._values()
+
+  def __hash__(self):
+    return hash((type(self), self._values()))
+
+  def __repr__(self):
+    return '{}({})'.format(type(self).__name__, ', '.join(
+      '{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+
+class ShowSummary(ViewModel):
+  # a show tile; updated_at is the latest change to the show, its artist
+  # or its venue
+  __slots__ = ('show_id', 'updated_at', 'start_time', 'venue_id', 'venue_name', 'venue_image_link',
+               'artist_id', 'artist_name', 'artist_image_link')
+
+
+class VenueView(ViewModel):
+  # COLUMNS are read from the venue row, in this order; genres is a tuple
+  # of names, the show lists tuples of ShowSummary
+  COLUMNS = ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+             'website_link', 'seeking_talent', 'seeking_description', 'upcoming_shows_count',
+             'past_shows_count', 'updated_at')
+  __slots__ = COLUMNS + ('genres', 'upcoming_shows', 'past_shows')
+
+
+class ArtistView(ViewModel):
+  COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link', 'website_link',
+             'seeking_talent', 'seeking_description', 'upcoming_shows_count', 'past_shows_count',
+             'updated_at')
+  __slots__ = COLUMNS + ('genres', 'upcoming_shows', 'past_shows')